@@ -4,10 +4,13 @@
 用于海南地区用户机和用户板的自动出库流程
 """
 
+import gc
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import Optional
+from operator import attrgetter
+from typing import Any, Callable, Dict, Optional, Tuple
 
 from src.utils.config import get_config
 from src.utils.logger import setup_logger
@@ -36,8 +39,8 @@ class WorkOrderAutomation:
         # 设置日志
         self.logger = setup_logger(
             name="workorder",
-            log_file=self.config.get("paths.log"),
-            level=self.config.get("system.log_level", "INFO")
+            log_file=self.config.log_path,
+            level=self.config.log_level
         )
         
         # 初始化认证器
@@ -45,39 +48,47 @@ class WorkOrderAutomation:
         self.asd_auth: Optional[ASDAuth] = None
         self.logistics_auth: Optional[LogisticsAuth] = None
         
-        # 初始化处理器
-        self.downloader: Optional[WorkOrderDownloader] = None
-        self.picking_processor: Optional[PickingProcessor] = None
+        # 各产品类型的下载/拣货流程（每种一组处理器，互不共享Session）
+        self._pipelines: Dict[
+            ProductType,
+            Callable[[Dict[str, int]], Optional[Dict[str, str]]]
+        ] = {}
+        # 发货处理器（待发货数据不区分产品类型，每轮只统一发货一次）
         self.shipping_processor: Optional[ShippingProcessor] = None
+        # 创建处理器时各认证器的登录代数，登录态变化后才重建处理器
+        self._processor_epochs: Optional[Tuple[int, ...]] = None
         
         # 初始化通知器
         self.notifier = init_notifier({"notification": self.config.notification})
     
     def _init_auth(self) -> bool:
-        """初始化所有认证器"""
+        """初始化所有认证器（已初始化时直接复用）"""
+        if self.workorder_auth is not None:
+            return True
+        
         try:
             # 工单系统
             self.workorder_auth = WorkOrderAuth(
-                base_url=self.config.get("urls.workorder.base"),
-                cookie_path=self.config.get("paths.cookies"),
-                captcha_path=self.config.get("paths.captcha")
+                base_url=self.config.workorder_base,
+                cookie_path=self.config.cookie_path,
+                captcha_path=self.config.captcha_path
             )
             
             # ASD系统
             self.asd_auth = ASDAuth(
-                base_url=self.config.get("urls.asd.base"),
-                cookie_path=self.config.get("paths.cookies") + ".asd"
+                base_url=self.config.asd_base,
+                cookie_path=self.config.cookie_path + ".asd"
             )
             
             # 物流系统
             self.logistics_auth = LogisticsAuth(
-                base_url=self.config.get("urls.logistics.base"),
-                cookie_path=self.config.get("paths.cookies") + ".logistics"
+                base_url=self.config.logistics_base,
+                cookie_path=self.config.cookie_path + ".logistics"
             )
             
             return True
         except Exception as e:
-            self.logger.error(f"初始化认证器失败: {e}")
+            self.logger.error("初始化认证器失败: %s", e)
             self.notifier.send_error(
                 error_type="认证器初始化",
                 error_message=str(e),
@@ -85,169 +96,325 @@ class WorkOrderAutomation:
             )
             return False
     
+    def _try_restore_sessions(self) -> bool:
+        """
+        尝试复用当前会话或Cookie中保存的登录态
+        
+        Returns:
+            是否所有系统均已处于登录状态
+        """
+        restored = True
+        for system_name, auth in (
+            ("工单系统", self.workorder_auth),
+            ("ASD家电系统", self.asd_auth),
+            ("大物流系统", self.logistics_auth),
+        ):
+            # 已有会话仍然有效时直接沿用，否则尝试从Cookie文件恢复
+            if auth.is_authenticated and auth.check_login():
+                continue
+            
+            if auth.load_cookies() and auth.check_login():
+                self.logger.info("使用Cookie成功登录%s", system_name)
+            else:
+                restored = False
+                if auth is self.workorder_auth:
+                    # 工单系统登录需要验证码，提前在后台下载识别，
+                    # 与其余系统的检查和登录重叠进行
+                    self.workorder_auth.prefetch_captcha()
+        return restored
+    
     def _login_all(self) -> bool:
-        """登录所有系统"""
+        """登录所有未处于登录状态的系统"""
         try:
             # 获取凭证
             wo_creds = self.config.credentials.get("workorder", {})
             asd_creds = self.config.credentials.get("asd", {})
             logistics_creds = self.config.credentials.get("logistics", {})
             
-            # 工单系统登录
-            self.logger.info("=========== 工单系统登录 ===========")
-            wo_username = wo_creds.get("username", "")
-            if not self.workorder_auth.ensure_login(
-                wo_username,
-                wo_creds.get("password", "")
-            ):
-                self.logger.error("工单系统登录失败")
-                self.notifier.send_login_failure(
-                    system_name="工单系统",
-                    username=wo_username,
-                    reason="验证码识别失败或凭证错误"
-                )
-                return False
-            
-            # ASD系统登录
-            self.logger.info("=========== ASD家电系统登录 ===========")
-            asd_username = asd_creds.get("username", "")
-            if not self.asd_auth.login(
-                asd_username,
-                asd_creds.get("password", "")
-            ):
-                self.logger.error("ASD家电系统登录失败")
-                self.notifier.send_login_failure(
-                    system_name="ASD家电系统",
-                    username=asd_username,
-                    reason="用户名或密码错误，或系统维护中"
-                )
-                return False
-            
-            # 物流系统登录
-            self.logger.info("=========== 大物流系统登录 ===========")
-            logistics_username = logistics_creds.get("username", "")
-            if not self.logistics_auth.login(
-                logistics_username,
-                logistics_creds.get("password", "")
-            ):
-                self.logger.error("大物流系统登录失败")
-                self.notifier.send_login_failure(
-                    system_name="大物流系统",
-                    username=logistics_username,
-                    reason="用户名或密码错误，或系统维护中"
-                )
-                return False
+            # 三个系统互不依赖，并发登录：(系统名, 认证器, 凭证, 失败原因)
+            candidates = [
+                ("工单系统", self.workorder_auth, wo_creds,
+                 "验证码识别失败或凭证错误"),
+                ("ASD家电系统", self.asd_auth, asd_creds,
+                 "用户名或密码错误，或系统维护中"),
+                ("大物流系统", self.logistics_auth, logistics_creds,
+                 "用户名或密码错误，或系统维护中"),
+            ]
+            # Cookie仍然有效的系统无需重新登录
+            logins = [item for item in candidates if not item[1].is_authenticated]
+            if not logins:
+                return True
             
-            # 初始化处理器
-            self.downloader = WorkOrderDownloader(self.workorder_auth)
-            self.picking_processor = PickingProcessor(self.asd_auth)
-            self.shipping_processor = ShippingProcessor(
-                self.logistics_auth,
-                self.config.self_pickup_staff
+            self.logger.info(
+                "=========== 登录%s ===========",
+                "/".join(item[0] for item in logins)
             )
+            with ThreadPoolExecutor(
+                max_workers=len(logins),
+                thread_name_prefix="login"
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        auth.login,
+                        creds.get("username", ""),
+                        creds.get("password", "")
+                    ): (system_name, creds.get("username", ""), reason)
+                    for system_name, auth, creds, reason in logins
+                }
+                
+                for future in as_completed(futures):
+                    system_name, username, reason = futures[future]
+                    if not future.result():
+                        self.logger.error("%s登录失败", system_name)
+                        self.notifier.send_login_failure(
+                            system_name=system_name,
+                            username=username,
+                            reason=reason
+                        )
+                        return False
             
             return True
             
         except Exception as e:
-            self.logger.error(f"登录过程异常: {e}")
+            self.logger.error("登录过程异常: %s", e)
             self.notifier.send_system_error(
                 error=e,
                 context={"phase": "系统登录阶段"}
             )
             return False
     
-    def process_product_type(self, product_type: ProductType) -> bool:
+    def _init_processors(self) -> None:
+        """为每种产品类型初始化出库流程，并初始化发货处理器（登录态未变化时复用）"""
+        epochs = (
+            self.workorder_auth.login_epoch,
+            self.asd_auth.login_epoch,
+            self.logistics_auth.login_epoch
+        )
+        if self._pipelines and epochs == self._processor_epochs:
+            return
+        
+        self._pipelines = {
+            product_type: self._build_pipeline(product_type)
+            for product_type in ProductType
+        }
+        self.shipping_processor = ShippingProcessor(
+            self.logistics_auth.clone(),
+            self.config.self_pickup_staff,
+            concurrency=self.config.shipping_concurrency
+        )
+        self._processor_epochs = epochs
+    
+    def _create_processors(
+        self
+    ) -> Tuple[WorkOrderDownloader, PickingProcessor]:
         """
-        处理指定产品类型的出库流程
+        创建一组下载/拣货处理器
+        
+        每组处理器使用复制出的认证器，拥有独立的Session，
+        便于不同产品类型并发处理
+        
+        Returns:
+            (工单下载器, 拣货处理器)
+        """
+        return (
+            WorkOrderDownloader(self.workorder_auth.clone()),
+            PickingProcessor(
+                self.asd_auth.clone(),
+                concurrency=self.config.picking_concurrency,
+                group_size=self.config.picking_group_size
+            )
+        )
+    
+    def _build_pipeline(
+        self,
+        product_type: ProductType
+    ) -> Callable[[Dict[str, int]], Optional[Dict[str, str]]]:
+        """
+        为指定产品类型构建下载/拣货流程
+        
+        文件路径、配置值和处理器方法在构建时即绑定为闭包变量，
+        每轮执行时无需再逐级查找属性
         
         Args:
             product_type: 产品类型（用户机/用户板）
             
         Returns:
-            是否处理成功
+            流程函数：就地更新传入的统计字典，返回SN到客户名的映射，失败返回None
         """
+        downloader, picking_processor = self._create_processors()
+        
+        logger = self.logger
         type_name = "用户机" if product_type == ProductType.USER_MACHINE else "用户板"
-        self.logger.info(f"=========== 开始处理{type_name} ===========")
+        csv_path = (
+            self.config.user_machine_csv
+            if product_type == ProductType.USER_MACHINE
+            else self.config.user_board_csv
+        )
+        download_completed_orders = downloader.download_completed_orders
+        parse_sn_list = downloader.parse_sn_list
+        pick_batch = picking_processor.pick_batch
         
-        try:
-            # 1. 确定文件路径
-            if product_type == ProductType.USER_MACHINE:
-                csv_path = self.config.get("paths.user_machine_csv")
-            else:
-                csv_path = self.config.get("paths.user_board_csv")
-            
-            # 2. 下载工单
-            self.logger.info("步骤1: 下载已完成工单")
-            if not self.downloader.download_completed_orders(
+        def run(stats: Dict[str, int]) -> Optional[Dict[str, str]]:
+            # 1. 下载工单
+            logger.info("步骤1: 下载已完成工单")
+            if not download_completed_orders(
                 product_type=product_type,
                 save_path=csv_path
             ):
-                self.logger.error("下载工单失败")
-                return False
+                logger.error("下载工单失败")
+                return None
             
-            # 3. 解析SN列表
-            self.logger.info("步骤2: 解析SN列表")
-            sn_list = self.downloader.parse_sn_list(csv_path)
+            # 2. 解析SN列表
+            logger.info("步骤2: 解析SN列表")
+            sn_list = parse_sn_list(csv_path)
             if not sn_list:
-                self.logger.warning("未找到有效的SN记录")
-                return True  # 没有数据不算失败
+                logger.warning("未找到有效的SN记录")
+                return {}  # 没有数据不算失败
             
-            # 4. 执行拣货
-            self.logger.info("步骤3: 执行拣货")
-            picking_records = self.picking_processor.pick_batch(sn_list)
+            # 3. 执行拣货
+            logger.info("步骤3: 执行拣货")
+            picking_records = pick_batch(sn_list)
             
             # 统计拣货结果
-            picking_success = sum(1 for r in picking_records if r.success)
+            picking_success = picking_records.success_count
             picking_failed = len(picking_records) - picking_success
-            self.logger.info(f"拣货完成: {picking_success}/{len(picking_records)} 成功")
+            logger.info("拣货完成: %d/%d 成功", picking_success, len(picking_records))
+            if picking_records and not picking_success:
+                # 全部失败多半是登录态已失效，下一轮重新登录
+                logger.warning("本轮拣货全部失败，下一轮将重新登录ASD家电系统")
+                self.asd_auth.invalidate()
+            
+            # 记录统计供汇总使用
+            stats["picking_success"] = picking_success
+            stats["picking_failed"] = picking_failed
+            stats["total"] = len(picking_records)
+            
+            # 构建SN到客户名的映射（可以从工单系统获取，这里简化处理）
+            sn_name_map = dict(zip(
+                map(attrgetter("sn_code"), sn_list),
+                map(attrgetter("customer_name"), sn_list)
+            ))
+            
+            logger.info("=========== %s拣货完成 ===========", type_name)
+            return sn_name_map
+        
+        return run
+    
+    def process_product_type(
+        self,
+        product_type: ProductType
+    ) -> Optional[Tuple[Dict[str, int], Dict[str, str]]]:
+        """
+        处理指定产品类型的下载和拣货
+        
+        Args:
+            product_type: 产品类型（用户机/用户板）
+            
+        Returns:
+            (处理统计, SN到客户名的映射)，处理失败返回None
+        """
+        type_name = "用户机" if product_type == ProductType.USER_MACHINE else "用户板"
+        self.logger.info("=========== 开始处理%s ===========", type_name)
+        
+        stats = {
+            "picking_success": 0,
+            "picking_failed": 0,
+            "total": 0,
+            "shipping_success": 0,
+            "shipping_failed": 0
+        }
+        
+        try:
+            sn_name_map = self._pipelines[product_type](stats)
+            if sn_name_map is None:
+                return None
+            return stats, sn_name_map
             
-            # 保存统计供汇总使用
-            self._last_picking_stats = {
-                "picking_success": picking_success,
-                "picking_failed": picking_failed,
-                "total": len(picking_records)
-            }
+        except Exception as e:
+            self.logger.error("处理%s时发生异常: %s", type_name, e, exc_info=True)
+            self.notifier.send_system_error(
+                error=e,
+                context={
+                    "product_type": type_name,
+                    "phase": "业务处理阶段"
+                }
+            )
+            return None
+    
+    def ship_pending(
+        self,
+        name_maps: Dict[ProductType, Dict[str, str]],
+        stats: Dict[str, Dict[str, Any]]
+    ) -> bool:
+        """
+        统一获取待发货数据并发货
+        
+        待发货数据不区分产品类型，两种产品的拣货完成后只查询和发货一次，
+        避免同一批数据被重复发货
+        
+        Args:
+            name_maps: 各产品类型的SN到客户名映射
+            stats: 各产品类型的处理统计，就地更新发货结果
             
-            # 5. 获取待发货数据
+        Returns:
+            是否处理成功
+        """
+        self.logger.info("=========== 开始发货 ===========")
+        
+        try:
+            # 4. 获取待发货数据
             self.logger.info("步骤4: 获取待发货数据")
             pending_shipments = self.shipping_processor.get_pending_shipments(
-                days_back=self.config.get("date_range.days_back", 29)
+                days_back=self.config.days_back
             )
             
             if not pending_shipments:
                 self.logger.warning("没有待发货记录")
                 return True
             
-            # 6. 执行发货
+            # 5. 执行发货（合并两种产品的SN映射）
             self.logger.info("步骤5: 执行发货")
-            # 构建SN到客户名的映射（可以从工单系统获取，这里简化处理）
-            sn_name_map = {sn.sn_code: sn.customer_name for sn in sn_list}
+            sn_name_map: Dict[str, str] = {}
+            for name_map in name_maps.values():
+                sn_name_map.update(name_map)
             
             shipping_records = self.shipping_processor.ship_batch(
                 pending_shipments,
                 sn_name_map
             )
+            # 发货完成后即释放待发货数据和合并映射，降低常驻循环的内存峰值
+            del pending_shipments, sn_name_map
             
-            # 统计发货结果
-            shipping_success = sum(1 for r in shipping_records if r.success)
-            shipping_failed = len(shipping_records) - shipping_success
-            self.logger.info(f"发货完成: {shipping_success}/{len(shipping_records)} 成功")
-            
-            # 更新统计
-            self._last_picking_stats["shipping_success"] = shipping_success
-            self._last_picking_stats["shipping_failed"] = shipping_failed
+            # 按SN所属产品类型统计发货结果，不属于任何一方的记录计入首个产品类型
+            fallback = next(iter(name_maps))
+            for product_type in name_maps:
+                type_stats = stats[product_type.value]
+                type_stats.setdefault("shipping_success", 0)
+                type_stats.setdefault("shipping_failed", 0)
+            for record in shipping_records:
+                product_type = next(
+                    (pt for pt, name_map in name_maps.items() if record.sn_code in name_map),
+                    fallback
+                )
+                key = "shipping_success" if record.success else "shipping_failed"
+                stats[product_type.value][key] += 1
             
-            self.logger.info(f"=========== {type_name}处理完成 ===========")
+            self.logger.info(
+                "发货完成: %d/%d 成功",
+                shipping_records.success_count,
+                len(shipping_records)
+            )
+            if shipping_records and not shipping_records.success_count:
+                # 全部失败多半是登录态已失效，下一轮重新登录
+                self.logger.warning("本轮发货全部失败，下一轮将重新登录大物流系统")
+                self.logistics_auth.invalidate()
             return True
             
         except Exception as e:
-            self.logger.error(f"处理{type_name}时发生异常: {e}", exc_info=True)
+            self.logger.error("发货时发生异常: %s", e, exc_info=True)
             self.notifier.send_system_error(
                 error=e,
-                context={
-                    "product_type": type_name,
-                    "phase": "业务处理阶段"
-                }
+                context={"phase": "发货阶段"}
             )
             return False
     
@@ -259,55 +426,82 @@ class WorkOrderAutomation:
             是否执行成功
         """
         start_time = datetime.now()
-        self.logger.info(f"============ {start_time} 开始执行 ============")
+        start_clock = time.monotonic()
+        self.logger.info("============ %s 开始执行 ============", start_time)
         
         # 处理统计
-        stats = {
+        stats: Dict[str, Dict[str, Any]] = {
             "user_machine": {"picking_success": 0, "shipping_success": 0},
             "user_board": {"picking_success": 0, "shipping_success": 0}
         }
         
-        try:
-            # 初始化认证器
-            if not self._init_auth():
-                return False
-            
-            # 登录所有系统
-            if not self._login_all():
+        # 本轮产生的所有通知合并为一条消息发送
+        with self.notifier.batch():
+            try:
+                # 初始化认证器
+                if not self._init_auth():
+                    return False
+                
+                # 优先复用Cookie登录态，仅对失效的系统重新登录
+                if not self._try_restore_sessions() and not self._login_all():
+                    return False
+                
+                # 初始化处理器
+                self._init_processors()
+                
+                # 并发下载和拣货用户机、用户板（两条流程互相独立，均为网络I/O密集）
+                name_maps: Dict[ProductType, Dict[str, str]] = {}
+                with ThreadPoolExecutor(
+                    max_workers=len(self._pipelines),
+                    thread_name_prefix="product"
+                ) as executor:
+                    futures = {
+                        product_type: executor.submit(
+                            self.process_product_type,
+                            product_type
+                        )
+                        for product_type in self._pipelines
+                    }
+                    
+                    for product_type, future in futures.items():
+                        result = future.result()
+                        if result is not None:
+                            stats[product_type.value], name_maps[product_type] = result
+                
+                # 待发货数据不区分产品类型，拣货完成后统一发货一次
+                if any(name_maps.values()):
+                    self.ship_pending(name_maps, stats)
+                del name_maps
+                
+                # 两条流程的数据均已释放，回收可能残留的循环引用
+                gc.collect()
+                
+                end_time = datetime.now()
+                duration = time.monotonic() - start_clock
+                self.logger.info(
+                    "============ %s 执行完成，耗时 %.2f 秒 ============",
+                    end_time,
+                    duration
+                )
+                # 发送每日汇总通知（可选，根据需求决定是否启用）
+                # self.notifier.send_daily_summary(
+                #     user_machine_stats=stats["user_machine"],
+                #     user_board_stats=stats["user_board"],
+                #     duration=duration
+                # )
+                
+                return True
+                
+            except Exception as e:
+                self.logger.error("执行过程中发生异常: %s", e, exc_info=True)
+                self.notifier.send_system_error(
+                    error=e,
+                    context={
+                        "phase": "主执行流程",
+                        "start_time": start_time.strftime('%Y-%m-%d %H:%M:%S')
+                    }
+                )
                 return False
-            
-            # 处理用户机
-            um_result = self.process_product_type(ProductType.USER_MACHINE)
-            if um_result and hasattr(self, '_last_picking_stats'):
-                stats["user_machine"] = self._last_picking_stats
-            
-            # 处理用户板
-            ub_result = self.process_product_type(ProductType.USER_BOARD)
-            if ub_result and hasattr(self, '_last_picking_stats'):
-                stats["user_board"] = self._last_picking_stats
-            
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            self.logger.info(f"============ {end_time} 执行完成，耗时 {duration:.2f} 秒 ============")
-            # 发送每日汇总通知（可选，根据需求决定是否启用）
-            # self.notifier.send_daily_summary(
-            #     user_machine_stats=stats["user_machine"],
-            #     user_board_stats=stats["user_board"],
-            #     duration=duration
-            # )
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"执行过程中发生异常: {e}", exc_info=True)
-            self.notifier.send_system_error(
-                error=e,
-                context={
-                    "phase": "主执行流程",
-                    "start_time": start_time.strftime('%Y-%m-%d %H:%M:%S')
-                }
-            )
-            return False
     
     def run_loop(self, interval_minutes: Optional[int] = None):
         """
@@ -316,15 +510,18 @@ class WorkOrderAutomation:
         Args:
             interval_minutes: 执行间隔（分钟），默认使用配置值
         """
-        interval = interval_minutes or self.config.get("system.interval", 30)
-        self.logger.info(f"启动循环模式，间隔 {interval} 分钟")
+        interval = interval_minutes or self.config.interval
+        self.logger.info("启动循环模式，间隔 %s 分钟", interval)
         
         while True:
+            cycle_start = time.monotonic()
             self.run_once()
-
-            next_run = datetime.now() + timedelta(minutes=interval)
-            self.logger.info(f"下次执行时间: {next_run}")
-            time.sleep(interval * 60)
+            
+            # 扣除本轮执行耗时，保证按配置的间隔准时开始下一轮
+            remaining = max(0.0, interval * 60 - (time.monotonic() - cycle_start))
+            next_run = datetime.now() + timedelta(seconds=remaining)
+            self.logger.info("下次执行时间: %s", next_run)
+            time.sleep(remaining)
 
 
 
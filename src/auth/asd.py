@@ -1,5 +1,6 @@
 """ASD家电系统认证"""
 
+import json
 import logging
 from typing import Optional
 
@@ -7,10 +8,21 @@ from .base import BaseAuth
 
 logger = logging.getLogger(__name__)
 
+# ASD家电系统固定请求头
+_ASD_HEADERS = {
+    "Accept-Encoding": "identity",
+    "Content-type": "application/x-www-form-urlencoded",
+    "User-Agent": "okhttp/4.9.0",
+    "Connection": "Keep-Alive",
+    "Host": "www.anyserves56.com"
+}
+
 
 class ASDAuth(BaseAuth):
     """ASD家电系统认证器"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         base_url: str = "https://www.anyserves56.com",
@@ -28,13 +40,7 @@ class ASDAuth(BaseAuth):
     
     def _setup_headers(self) -> None:
         """设置请求头"""
-        self.session.headers.update({
-            "Accept-Encoding": "identity",
-            "Content-type": "application/x-www-form-urlencoded",
-            "User-Agent": "okhttp/4.9.0",
-            "Connection": "Keep-Alive",
-            "Host": "www.anyserves56.com"
-        })
+        self.session.headers.update(_ASD_HEADERS)
     
     def login(self, username: str, password: str, **kwargs) -> bool:
         """
@@ -61,15 +67,14 @@ class ASDAuth(BaseAuth):
             
             if result.get("success"):
                 logger.info("ASD家电系统登录成功")
-                self._is_authenticated = True
-                self.save_cookies()
+                self._mark_logged_in()
                 return True
             else:
-                logger.error(f"ASD家电系统登录失败: {result}")
+                logger.error("ASD家电系统登录失败: %s", result)
                 return False
                 
         except Exception as e:
-            logger.error(f"ASD家电系统登录异常: {e}")
+            logger.error("ASD家电系统登录异常: %s", e)
             return False
     
     def check_login(self) -> bool:
@@ -79,5 +84,23 @@ class ASDAuth(BaseAuth):
         Returns:
             是否已登录
         """
-        # ASD系统没有直接的检查接口，通过后续操作判断
-        return self._is_authenticated
+        # ASD系统没有直接的检查接口，使用只读的SN查询接口探测：
+        # 只有返回业务JSON（含 success 或 data 字段）才视为已登录，
+        # 重定向或返回登录页均为未登录
+        try:
+            url = "/wms-web/rfweb/rfController/querySoSkuBySn"
+            response = self.post(
+                url,
+                data={"data": json.dumps({"snCode": ""})},
+                allow_redirects=False
+            )
+            
+            body = self._json_body(response)
+            self._is_authenticated = body is not None and (
+                "success" in body or "data" in body
+            )
+            return self._is_authenticated
+            
+        except Exception:
+            self._is_authenticated = False
+            return False
@@ -1,12 +1,16 @@
 """认证基类"""
 
-import json
+import copy
 import logging
 from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import Optional, Dict, Any
+
+import orjson
 from requests import Session, Response
+from requests.adapters import HTTPAdapter
 from requests.cookies import RequestsCookieJar
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +18,24 @@ logger = logging.getLogger(__name__)
 class BaseAuth(ABC):
     """认证基类"""
     
+    __slots__ = (
+        "base_url", "cookie_path", "session", "_is_authenticated", "_login_epoch"
+    )
+    
+    # 连接池大小（按主机缓存的连接池数 / 每个主机保持的长连接数）
+    POOL_CONNECTIONS = 32
+    POOL_MAXSIZE = 64
+    
+    # 自动重试：连接失败及网关类错误。状态码重试只对GET生效，
+    # 拣货/发货等POST不是幂等操作，重复提交可能造成重复发货
+    RETRY = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False
+    )
+    
     def __init__(self, base_url: str, cookie_path: Optional[str] = None):
         """
         初始化认证器
@@ -24,14 +46,70 @@ class BaseAuth(ABC):
         """
         self.base_url = base_url.rstrip("/")
         self.cookie_path = cookie_path
-        self.session = Session()
+        self.session = self._create_session()
         self._is_authenticated = False
+        self._login_epoch = 0
+    
+    @classmethod
+    def _create_session(cls) -> Session:
+        """
+        创建带长连接池和自动重试的Session
+        
+        Returns:
+            Session实例
+        """
+        session = Session()
+        adapter = HTTPAdapter(
+            pool_connections=cls.POOL_CONNECTIONS,
+            pool_maxsize=cls.POOL_MAXSIZE,
+            max_retries=cls.RETRY
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
     
     @property
     def is_authenticated(self) -> bool:
         """是否已认证"""
         return self._is_authenticated
     
+    @property
+    def login_epoch(self) -> int:
+        """登录代数：每次登录成功或加载Cookie后递增，用于判断Session是否已更换"""
+        return self._login_epoch
+    
+    def invalidate(self) -> None:
+        """标记登录态已失效并清除Cookie，下次使用前重新登录"""
+        self._is_authenticated = False
+        self.clear_cookies()
+    
+    @staticmethod
+    def _json_body(response: Response) -> Optional[Dict[str, Any]]:
+        """
+        解析登录探测接口的JSON响应
+        
+        未登录时接口可能重定向或直接返回HTML登录页，均视为无效响应
+        
+        Args:
+            response: 探测请求的响应
+            
+        Returns:
+            JSON对象，非200或不是JSON对象时返回None
+        """
+        if response.status_code != 200:
+            return None
+        try:
+            body = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            return None
+        return body if isinstance(body, dict) else None
+    
+    def _mark_logged_in(self) -> None:
+        """登录成功后更新状态并保存Cookie"""
+        self._is_authenticated = True
+        self._login_epoch += 1
+        self.save_cookies()
+    
     @abstractmethod
     def login(self, username: str, password: str, **kwargs) -> bool:
         """
@@ -64,12 +142,12 @@ class BaseAuth(ABC):
         
         try:
             cookie_dict = dict(self.session.cookies)
-            Path(self.cookie_path).parent.mkdir(parents=True, exist_ok=True)
-            with open(self.cookie_path, "w", encoding="utf-8") as f:
-                json.dump(cookie_dict, f, ensure_ascii=False, indent=2)
-            logger.debug(f"Cookie已保存到: {self.cookie_path}")
+            cookie_file = Path(self.cookie_path)
+            cookie_file.parent.mkdir(parents=True, exist_ok=True)
+            cookie_file.write_bytes(orjson.dumps(cookie_dict))
+            logger.debug("Cookie已保存到: %s", self.cookie_path)
         except Exception as e:
-            logger.error(f"保存Cookie失败: {e}")
+            logger.error("保存Cookie失败: %s", e)
     
     def load_cookies(self) -> bool:
         """
@@ -82,32 +160,51 @@ class BaseAuth(ABC):
             return False
         
         try:
-            with open(self.cookie_path, "r", encoding="utf-8") as f:
-                cookie_dict = json.load(f)
+            cookie_dict = orjson.loads(Path(self.cookie_path).read_bytes())
             
             cookies = RequestsCookieJar()
             for key, value in cookie_dict.items():
                 cookies.set(key, value)
             
             self.session.cookies.update(cookies)
-            logger.debug(f"Cookie已从 {self.cookie_path} 加载")
+            self._login_epoch += 1
+            logger.debug("Cookie已从 %s 加载", self.cookie_path)
             return True
         except Exception as e:
-            logger.error(f"加载Cookie失败: {e}")
+            logger.error("加载Cookie失败: %s", e)
             return False
     
     def clear_cookies(self) -> None:
         """清除Cookie"""
         self.session.cookies.clear()
-        if self.cookie_path and Path(self.cookie_path).exists():
-            Path(self.cookie_path).unlink()
+        if self.cookie_path:
+            Path(self.cookie_path).unlink(missing_ok=True)
+    
+    def clone(self) -> "BaseAuth":
+        """
+        复制认证器（独立Session，共享当前的请求头和Cookie）
+        
+        用于并发处理时为每个线程提供独立的连接，避免共享同一个Session
+        
+        Returns:
+            新的认证器实例
+        """
+        twin = copy.copy(self)
+        twin.session = self._create_session()
+        twin.session.headers.update(self.session.headers)
+        twin.session.cookies.update(self.session.cookies)
+        return twin
     
     def get(self, url: str, **kwargs) -> Response:
-        """发送GET请求"""
-        full_url = f"{self.base_url}{url}" if url.startswith("/") else url
-        return self.session.get(full_url, **kwargs)
+        """发送GET请求（以"/"开头的相对路径会拼接base_url）"""
+        return self.session.get(
+            self.base_url + url if url[:1] == "/" else url,
+            **kwargs
+        )
     
     def post(self, url: str, **kwargs) -> Response:
-        """发送POST请求"""
-        full_url = f"{self.base_url}{url}" if url.startswith("/") else url
-        return self.session.post(full_url, **kwargs)
+        """发送POST请求（以"/"开头的相对路径会拼接base_url）"""
+        return self.session.post(
+            self.base_url + url if url[:1] == "/" else url,
+            **kwargs
+        )
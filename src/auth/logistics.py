@@ -7,10 +7,24 @@ from .base import BaseAuth
 
 logger = logging.getLogger(__name__)
 
+# 大物流系统固定请求头
+_LOGISTICS_HEADERS = {
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+    "Connection": "keep-alive",
+    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+    "Host": "www.anyserves56.com",
+    "Origin": "https://www.anyserves56.com",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.0.36",
+    "X-Requested-With": "XMLHttpRequest"
+}
+
 
 class LogisticsAuth(BaseAuth):
     """大物流系统认证器"""
     
+    __slots__ = ()
+    
     def __init__(
         self,
         base_url: str = "https://www.anyserves56.com",
@@ -28,16 +42,7 @@ class LogisticsAuth(BaseAuth):
     
     def _setup_headers(self) -> None:
         """设置请求头"""
-        self.session.headers.update({
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "Accept-Language": "zh-CN,zh;q=0.9",
-            "Connection": "keep-alive",
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "Host": "www.anyserves56.com",
-            "Origin": "https://www.anyserves56.com",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.0.36",
-            "X-Requested-With": "XMLHttpRequest"
-        })
+        self.session.headers.update(_LOGISTICS_HEADERS)
     
     def login(self, username: str, password: str, **kwargs) -> bool:
         """
@@ -65,15 +70,14 @@ class LogisticsAuth(BaseAuth):
             
             if result.get("success"):
                 logger.info("大物流系统登录成功")
-                self._is_authenticated = True
-                self.save_cookies()
+                self._mark_logged_in()
                 return True
             else:
-                logger.error(f"大物流系统登录失败: {result}")
+                logger.error("大物流系统登录失败: %s", result)
                 return False
                 
         except Exception as e:
-            logger.error(f"大物流系统登录异常: {e}")
+            logger.error("大物流系统登录异常: %s", e)
             return False
     
     def check_login(self) -> bool:
@@ -83,12 +87,17 @@ class LogisticsAuth(BaseAuth):
         Returns:
             是否已登录
         """
-        # 通过查询接口检查
+        # 通过查询接口检查：只有返回分页JSON（含 rows 字段）才视为已登录
         try:
             url = "/wms-web/oubweb/outboundSoController/collectSoOrderGroupByStatus.shtml"
-            response = self.post(url, data={"page.currentPage": "1", "page.limitCount": "1"})
+            response = self.post(
+                url,
+                data={"page.currentPage": "1", "page.limitCount": "1"},
+                allow_redirects=False
+            )
             
-            if response.status_code == 200:
+            body = self._json_body(response)
+            if body is not None and "rows" in body:
                 self._is_authenticated = True
                 return True
             
@@ -1,8 +1,12 @@
 """工单系统认证"""
 
 import logging
+import os
+import random
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
 from typing import Optional, Tuple
-from fake_useragent import UserAgent
 
 from .base import BaseAuth
 from ..utils.encryption import PasswordEncryptor
@@ -10,10 +14,49 @@ from ..utils.captcha import CaptchaRecognizer
 
 logger = logging.getLogger(__name__)
 
+# 常见桌面浏览器UA，登录时随机选用一个
+UA_POOL = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+)
+
+
+def _random_user_agent() -> str:
+    """
+    随机选取User-Agent
+    
+    设置环境变量 HN_DYNAMIC_UA 时使用 fake_useragent 的UA库，否则从内置列表中选取
+    
+    Returns:
+        User-Agent字符串
+    """
+    if os.getenv("HN_DYNAMIC_UA"):
+        try:
+            from fake_useragent import UserAgent
+            return UserAgent().random
+        except Exception as e:
+            logger.warning("fake_useragent 不可用，使用内置UA: %s", e)
+    return random.choice(UA_POOL)
+
 
 class WorkOrderAuth(BaseAuth):
     """工单系统认证器"""
     
+    __slots__ = (
+        "captcha_path", "encryptor", "captcha_recognizer", "_captcha_future",
+        "_captcha_cache", "_captcha_file"
+    )
+    
+    # 已识别验证码的复用时长（秒），服务端验证码有效期内重试无需重新获取和识别
+    CAPTCHA_TTL = 50
+    
     def __init__(
         self,
         base_url: str = "https://gd.anyserves56.com",
@@ -30,9 +73,14 @@ class WorkOrderAuth(BaseAuth):
         """
         super().__init__(base_url, cookie_path)
         self.captcha_path = captcha_path
+        self._captcha_file: Optional[Path] = None
+        if captcha_path:
+            self._captcha_file = Path(captcha_path)
+            self._captcha_file.parent.mkdir(parents=True, exist_ok=True)
         self.encryptor = PasswordEncryptor()
         self.captcha_recognizer = CaptchaRecognizer()
-        self.ua = UserAgent()
+        self._captcha_future: Optional[Future] = None
+        self._captcha_cache: Optional[Tuple[str, float]] = None
         self._setup_headers()
     
     def _setup_headers(self) -> None:
@@ -43,7 +91,7 @@ class WorkOrderAuth(BaseAuth):
             "Connection": "keep-alive",
             "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
             "X-Requested-With": "XMLHttpRequest",
-            "User-Agent": self.ua.random
+            "User-Agent": _random_user_agent()
         })
     
     def get_captcha(self) -> Tuple[Optional[str], Optional[bytes]]:
@@ -62,20 +110,52 @@ class WorkOrderAuth(BaseAuth):
             image_bytes = response.content
             
             # 保存验证码图片
-            if self.captcha_path:
-                from pathlib import Path
-                Path(self.captcha_path).parent.mkdir(parents=True, exist_ok=True)
-                with open(self.captcha_path, "wb") as f:
-                    f.write(image_bytes)
+            if self._captcha_file:
+                self._captcha_file.write_bytes(image_bytes)
             
             # 识别验证码
             code = self.captcha_recognizer.recognize(image_bytes)
             return code, image_bytes
             
         except Exception as e:
-            logger.error(f"获取验证码失败: {e}")
+            logger.error("获取验证码失败: %s", e)
             return None, None
     
+    def prefetch_captcha(self) -> Future:
+        """
+        在后台线程中提前获取并识别验证码
+        
+        下一次登录的首次尝试会直接使用该结果，使验证码下载和OCR
+        与其他系统的登录过程重叠进行
+        
+        Returns:
+            结果为 (验证码文本, 验证码图片字节) 的Future
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="captcha")
+        self._captcha_future = executor.submit(self.get_captcha)
+        executor.shutdown(wait=False)
+        return self._captcha_future
+    
+    def _next_captcha(self) -> Tuple[Optional[str], Optional[bytes]]:
+        """
+        获取用于本次登录尝试的验证码
+        
+        优先使用预取结果，其次复用有效期内已识别的验证码（此时不返回图片）
+        
+        Returns:
+            (验证码文本, 验证码图片字节)
+        """
+        future, self._captcha_future = self._captcha_future, None
+        if future is not None:
+            code, image_bytes = future.result()
+        elif self._captcha_cache and time.monotonic() - self._captcha_cache[1] < self.CAPTCHA_TTL:
+            return self._captcha_cache[0], None
+        else:
+            code, image_bytes = self.get_captcha()
+        
+        self._captcha_cache = (code, time.monotonic()) if code else None
+        return code, image_bytes
+    
     def login(self, username: str, password: str, max_retry: int = 5) -> bool:
         """
         登录工单系统
@@ -90,40 +170,46 @@ class WorkOrderAuth(BaseAuth):
         """
         login_url = "/index.php/Public/login.html"
         
+        # 登录数据（每次尝试只更新验证码和加密后的密码）
+        data = {
+            "username": username,
+            "accesstoken": "",
+            "imgcode": "",
+            "event_submit_do_login": "submit"
+        }
+        
         for attempt in range(max_retry):
             try:
                 # 获取验证码
-                code, _ = self.get_captcha()
+                code, _ = self._next_captcha()
                 if not code:
-                    logger.warning(f"登录尝试 {attempt + 1}/{max_retry}: 验证码获取失败")
+                    logger.warning("登录尝试 %d/%d: 验证码获取失败", attempt + 1, max_retry)
                     continue
                 
-                # 加密密码
-                encrypted_pwd = self.encryptor.encrypt(password)
-                
-                # 登录数据
-                data = {
-                    "username": username,
-                    "accesstoken": encrypted_pwd,
-                    "imgcode": code,
-                    "event_submit_do_login": "submit"
-                }
+                # 加密密码（密钥按日期生成，每次尝试重新计算以免跨越零点时失效）
+                data["accesstoken"] = self.encryptor.encrypt(password)
+                data["imgcode"] = code
                 
                 response = self.post(login_url, data=data)
                 result = response.json()
                 
                 if result.get("code") == 0:
                     logger.info("工单系统登录成功")
-                    self._is_authenticated = True
-                    self.save_cookies()
+                    self._captcha_cache = None
+                    self._mark_logged_in()
                     return True
                 else:
-                    logger.warning(f"登录尝试 {attempt + 1}/{max_retry} 失败: {result.get('msg')}")
+                    msg = result.get("msg")
+                    logger.warning("登录尝试 %d/%d 失败: %s", attempt + 1, max_retry, msg)
+                    
+                    # 仅验证码错误时丢弃已识别的验证码，其他失败原因下次重试继续使用
+                    if "验证码" in str(msg):
+                        self._captcha_cache = None
                     
             except Exception as e:
-                logger.error(f"登录尝试 {attempt + 1}/{max_retry} 异常: {e}")
+                logger.error("登录尝试 %d/%d 异常: %s", attempt + 1, max_retry, e)
         
-        logger.error(f"登录失败，已重试 {max_retry} 次")
+        logger.error("登录失败，已重试 %d 次", max_retry)
         return False
     
     def check_login(self) -> bool:
@@ -145,7 +231,7 @@ class WorkOrderAuth(BaseAuth):
             return False
             
         except Exception as e:
-            logger.error(f"检查登录状态失败: {e}")
+            logger.error("检查登录状态失败: %s", e)
             self._is_authenticated = False
             return False
     
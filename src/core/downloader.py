@@ -1,8 +1,10 @@
 """工单下载器"""
 
 import csv
+import gc
 import logging
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional
 from urllib.parse import urlencode
@@ -20,6 +22,12 @@ class WorkOrderDownloader:
     CSV_ENCODING = "gbk"
     # SN列名
     SN_COLUMN = "机号1(sn)"
+    # 客户姓名列名
+    NAME_COLUMN = "客户姓名"
+    # 下载时每次写入磁盘的块大小
+    DOWNLOAD_CHUNK_SIZE = 256 * 1024
+    # 解析时的文件读取缓冲区大小
+    READ_BUFFER_SIZE = 1024 * 1024
     
     def __init__(self, auth: WorkOrderAuth):
         """
@@ -79,20 +87,26 @@ class WorkOrderDownloader:
         
         url = f"/index.php/Order/exportorder.html?{urlencode(params)}"
         
+        save_file = Path(save_path)
+        part_file = save_file.with_name(save_file.name + ".part")
+        
         try:
-            response = self.auth.get(url)
-            response.raise_for_status()
-            
-            # 保存文件
-            Path(save_path).parent.mkdir(parents=True, exist_ok=True)
-            with open(save_path, "wb") as f:
-                f.write(response.content)
+            # 流式下载：边接收边写入临时文件，完成后再替换，失败时不留下不完整的CSV
+            with self.auth.get(url, stream=True) as response:
+                response.raise_for_status()
+                
+                save_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(part_file, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
             
+            part_file.replace(save_file)
             logger.info(f"工单数据已下载: {save_path}")
             return True
             
         except Exception as e:
             logger.error(f"下载工单数据失败: {e}")
+            part_file.unlink(missing_ok=True)
             return False
     
     def parse_sn_list(self, csv_path: str) -> List[SNRecord]:
@@ -107,30 +121,52 @@ class WorkOrderDownloader:
         """
         records = []
         
+        # 产品类型只取决于文件路径，整个文件解析一次即可
+        product_type = self._detect_product_type(csv_path)
+        
+        # 解析期间只创建长期存活的记录对象，暂停分代GC避免反复触发扫描
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        
         try:
-            with open(csv_path, mode="r", encoding=self.CSV_ENCODING) as file:
-                reader = csv.DictReader(file)
+            with open(
+                csv_path,
+                mode="r",
+                encoding=self.CSV_ENCODING,
+                newline="",
+                buffering=self.READ_BUFFER_SIZE
+            ) as file:
+                # 只按列下标读取需要的两列，不为每行构建完整的字典
+                reader = csv.reader(file)
+                header = next(reader, [])
+                
+                if self.SN_COLUMN not in header:
+                    logger.warning(f"{csv_path} 中未找到列: {self.SN_COLUMN}")
+                    return []
+                
+                sn_idx = header.index(self.SN_COLUMN)
+                name_idx = header.index(self.NAME_COLUMN) if self.NAME_COLUMN in header else -1
+                
+                append = records.append
                 
                 for row in reader:
-                    sn_value = row.get(self.SN_COLUMN, "").strip()
+                    if sn_idx >= len(row):
+                        continue
+                    
+                    sn_value = row[sn_idx].strip()
                     if not sn_value:
                         continue
                     
-                    # 处理格式问题（去除引号）
+                    # 处理格式问题（去除引号）：含引号时取第一对引号之间的内容
                     if '"' in sn_value:
-                        parts = sn_value.split('"')
-                        sn_value = parts[1] if len(parts) > 1 else sn_value
-                    
-                    # 确定产品类型
-                    product_type = self._detect_product_type(csv_path)
+                        sn_value = sn_value.split('"', 2)[1]
                     
-                    record = SNRecord(
+                    append(SNRecord.model_construct(
                         sn_code=sn_value,
                         product_type=product_type,
-                        customer_name=row.get("客户姓名", ""),
+                        customer_name=row[name_idx] if 0 <= name_idx < len(row) else "",
                         status="completed"
-                    )
-                    records.append(record)
+                    ))
             
             logger.info(f"从 {csv_path} 解析到 {len(records)} 条SN记录")
             return records
@@ -138,8 +174,14 @@ class WorkOrderDownloader:
         except Exception as e:
             logger.error(f"解析SN列表失败: {e}")
             return []
+        
+        finally:
+            if gc_was_enabled:
+                gc.enable()
     
-    def _detect_product_type(self, csv_path: str) -> ProductType:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _detect_product_type(csv_path: str) -> ProductType:
         """
         根据文件路径检测产品类型
         
@@ -2,11 +2,17 @@
 
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+import orjson
 
 from ..auth.asd import ASDAuth
-from ..models.sn_record import SNRecord, PickingRecord
+from ..models.sn_record import SNRecord, PickingRecord, BatchResult
 
 logger = logging.getLogger(__name__)
 
@@ -14,14 +20,33 @@ logger = logging.getLogger(__name__)
 class PickingProcessor:
     """拣货处理器"""
     
-    def __init__(self, auth: ASDAuth):
+    # 批量拣货时同时进行的SN数量（合并建单时为同时处理的出货单数量）
+    DEFAULT_CONCURRENCY = 16
+    # SN查询结果缓存时长（秒）及最大条数
+    QUERY_CACHE_TTL = 300
+    QUERY_CACHE_SIZE = 4096
+    
+    def __init__(
+        self,
+        auth: ASDAuth,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        group_size: int = 0
+    ):
         """
         初始化拣货处理器
         
         Args:
             auth: ASD系统认证器
+            concurrency: 批量拣货并发数
+            group_size: 每张出货单合并的SN数量，0或1表示逐个SN建单
         """
         self.auth = auth
+        self.concurrency = max(1, concurrency)
+        self.group_size = max(0, group_size)
+        # sn_code -> (SN信息, 查询时间)，按写入顺序排列；用于建单后即移除
+        self._query_cache: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # 批量拣货的各线程共享查询缓存
+        self._query_cache_lock = threading.Lock()
     
     def pick_sn(self, sn_code: str) -> PickingRecord:
         """
@@ -39,7 +64,7 @@ class PickingProcessor:
         Returns:
             拣货记录
         """
-        record = PickingRecord(sn_code=sn_code, so_no="", success=False)
+        record = PickingRecord.model_construct(sn_code=sn_code, so_no="", success=False)
         
         try:
             # 步骤1：查询SN
@@ -48,31 +73,35 @@ class PickingProcessor:
                 record.message = "查询SN失败"
                 return record
             
-            # 步骤2：创建出货单
-            step2_result = self._create_order(step1_result)
-            if not step2_result:
-                record.message = "创建出货单失败"
-                return record
-            
-            so_no = step2_result
-            record.so_no = so_no
-            
-            # 步骤3：查询拣货详情
-            step3_result = self._query_pick_detail(so_no)
-            if not step3_result:
-                record.message = "查询拣货详情失败"
-                return record
-            
-            # 步骤4：确认拣货
-            step4_success = self._confirm_pick(so_no, sn_code)
-            if not step4_success:
-                record.message = "确认拣货失败"
-                return record
-            
-            record.success = True
-            record.message = "拣货成功"
-            record.picked_at = datetime.now()
-            logger.info(f"SN {sn_code} 拣货成功")
+            try:
+                # 步骤2：创建出货单
+                step2_result = self._create_order([step1_result])
+                if not step2_result:
+                    record.message = "创建出货单失败"
+                    return record
+                
+                so_no = step2_result
+                record.so_no = so_no
+                
+                # 步骤3：查询拣货详情
+                step3_result = self._query_pick_detail(so_no)
+                if not step3_result:
+                    record.message = "查询拣货详情失败"
+                    return record
+                
+                # 步骤4：确认拣货
+                step4_success = self._confirm_pick(so_no, sn_code)
+                if not step4_success:
+                    record.message = "确认拣货失败"
+                    return record
+                
+                record.success = True
+                record.message = "拣货成功"
+                record.picked_at = datetime.now()
+                logger.info(f"SN {sn_code} 拣货成功")
+            finally:
+                # 查询结果已用于建单，无论成败都不再复用，下次拣货重新查询
+                self._forget_queries((sn_code,))
             
         except Exception as e:
             record.message = f"拣货异常: {str(e)}"
@@ -80,28 +109,186 @@ class PickingProcessor:
         
         return record
     
-    def pick_batch(self, sn_list: List[SNRecord]) -> List[PickingRecord]:
+    def pick_batch(self, sn_list: List[SNRecord]) -> BatchResult[PickingRecord]:
         """
         批量拣货
         
+        各SN的拣货流程互不依赖，按 concurrency 限制并发执行，
+        返回结果与输入顺序一致
+        
         Args:
             sn_list: SN记录列表
             
         Returns:
-            拣货记录列表
+            拣货记录列表（含成功数 success_count）
         """
-        records = []
+        if self.group_size > 1:
+            return self.pick_batch_grouped(sn_list)
+        
+        sn_list = self._dedupe(sn_list)
         total = len(sn_list)
         
-        for idx, sn_record in enumerate(sn_list, 1):
+        def pick_one(idx: int, sn_record: SNRecord) -> PickingRecord:
             logger.info(f"[{idx}/{total}] 处理拣货: {sn_record.sn_code}")
-            record = self.pick_sn(sn_record.sn_code)
-            records.append(record)
+            return self.pick_sn(sn_record.sn_code)
+        
+        with ThreadPoolExecutor(
+            max_workers=min(self.concurrency, total) or 1,
+            thread_name_prefix="picking"
+        ) as executor:
+            records = list(executor.map(pick_one, range(1, total + 1), sn_list))
+        
+        # 统计
+        success_count = sum(1 for r in records if r.success)
+        logger.info(f"批量拣货完成: {success_count}/{total} 成功")
+        
+        return BatchResult(records, success_count)
+    
+    def pick_batch_grouped(
+        self,
+        sn_list: List[SNRecord],
+        group_size: Optional[int] = None
+    ) -> BatchResult[PickingRecord]:
+        """
+        合并建单的批量拣货
+        
+        每 group_size 个SN创建一张出货单，拣货详情按单查询一次，
+        再逐个SN确认拣货。服务器不接受多商品出货单时，该组回退为逐个SN拣货
+        
+        Args:
+            sn_list: SN记录列表
+            group_size: 每张出货单的SN数量，默认使用初始化时的配置
+            
+        Returns:
+            拣货记录列表（含成功数 success_count）
+        """
+        size = max(1, group_size or self.group_size)
+        sn_list = self._dedupe(sn_list)
+        total = len(sn_list)
+        groups = [sn_list[i:i + size] for i in range(0, total, size)]
+        
+        def pick_group(idx: int, group: List[SNRecord]) -> List[PickingRecord]:
+            start = (idx - 1) * size + 1
+            logger.info(f"[{start}-{start + len(group) - 1}/{total}] 合并拣货: {len(group)} 个SN")
+            return self._pick_group(group)
+        
+        with ThreadPoolExecutor(
+            max_workers=min(self.concurrency, len(groups)) or 1,
+            thread_name_prefix="picking"
+        ) as executor:
+            records = [
+                record
+                for group_records in executor.map(pick_group, range(1, len(groups) + 1), groups)
+                for record in group_records
+            ]
         
         # 统计
         success_count = sum(1 for r in records if r.success)
         logger.info(f"批量拣货完成: {success_count}/{total} 成功")
         
+        return BatchResult(records, success_count)
+    
+    @staticmethod
+    def _dedupe(sn_list: List[SNRecord]) -> List[SNRecord]:
+        """
+        按SN编码去重，保留首次出现的记录及其顺序
+        
+        并发拣货时重复的SN可能同时查询成功并各自建单，需在分发前去重
+        
+        Args:
+            sn_list: SN记录列表
+            
+        Returns:
+            去重后的SN记录列表
+        """
+        unique: Dict[str, SNRecord] = {}
+        for sn_record in sn_list:
+            unique.setdefault(sn_record.sn_code, sn_record)
+        
+        if len(unique) < len(sn_list):
+            logger.info(f"忽略重复SN: {len(sn_list) - len(unique)} 条")
+            return list(unique.values())
+        return sn_list
+    
+    def _pick_group(self, group: List[SNRecord]) -> List[PickingRecord]:
+        """
+        对一组SN合并创建出货单并拣货
+        
+        Args:
+            group: SN记录列表
+            
+        Returns:
+            拣货记录列表，与输入顺序一致
+        """
+        records = [
+            PickingRecord.model_construct(sn_code=sn_record.sn_code, so_no="", success=False)
+            for sn_record in group
+        ]
+        
+        # 步骤1：逐个查询SN，查询失败的SN不加入出货单
+        items = []
+        queried = []
+        for record in records:
+            try:
+                item_data = self._query_sn(record.sn_code)
+            except Exception as e:
+                record.message = f"拣货异常: {str(e)}"
+                logger.error(f"SN {record.sn_code} 拣货异常: {e}")
+                continue
+            
+            if not item_data:
+                record.message = "查询SN失败"
+                continue
+            
+            items.append(item_data)
+            queried.append(record)
+        
+        if not queried:
+            return records
+        
+        so_no = ""
+        try:
+            # 步骤2：合并创建出货单，失败时回退为逐个SN拣货
+            # 建单成功或异常后SN可能已关联出货单，缓存的查询结果不能再用于建单；
+            # 服务器明确拒绝时保留，供回退的逐个拣货使用（其建单后同样会移除）
+            try:
+                so_no = self._create_order(items)
+            except Exception:
+                self._forget_queries([record.sn_code for record in queried])
+                raise
+            if so_no:
+                self._forget_queries([record.sn_code for record in queried])
+            else:
+                logger.warning(f"合并创建出货单失败，回退为逐个SN拣货: {len(queried)} 个SN")
+                fallback = {record.sn_code: self.pick_sn(record.sn_code) for record in queried}
+                return [fallback.get(record.sn_code, record) for record in records]
+            
+            for record in queried:
+                record.so_no = so_no
+            
+            # 步骤3：按单查询拣货详情
+            if not self._query_pick_detail(so_no):
+                for record in queried:
+                    record.message = "查询拣货详情失败"
+                return records
+            
+            # 步骤4：逐个SN确认拣货
+            for record in queried:
+                if not self._confirm_pick(so_no, record.sn_code):
+                    record.message = "确认拣货失败"
+                    continue
+                
+                record.success = True
+                record.message = "拣货成功"
+                record.picked_at = datetime.now()
+                logger.info(f"SN {record.sn_code} 拣货成功")
+        
+        except Exception as e:
+            for record in queried:
+                if not record.success:
+                    record.message = f"拣货异常: {str(e)}"
+            logger.error(f"出货单 {so_no} 拣货异常: {e}")
+        
         return records
     
     def _query_sn(self, sn_code: str) -> Dict[str, Any]:
@@ -114,24 +301,61 @@ class PickingProcessor:
         Returns:
             SN信息字典
         """
+        with self._query_cache_lock:
+            cached = self._query_cache.get(sn_code)
+        if cached and time.monotonic() - cached[1] < self.QUERY_CACHE_TTL:
+            return cached[0]
+        
         url = "/wms-web/rfweb/rfController/querySoSkuBySn"
         data = {"data": json.dumps({"snCode": sn_code})}
         
         response = self.auth.post(url, data=data)
-        result = response.json()
+        result = orjson.loads(response.content)
         
         if result.get("data"):
+            self._cache_query(sn_code, result["data"])
             return result["data"]
         
         logger.warning(f"查询SN {sn_code} 无结果: {result}")
         return {}
     
-    def _create_order(self, item_data: Dict[str, Any]) -> str:
+    def _cache_query(self, sn_code: str, item_data: Dict[str, Any]) -> None:
+        """
+        缓存SN查询结果（先清理过期条目，超过容量时淘汰最早写入的条目）
+        
+        Args:
+            sn_code: SN编码
+            item_data: SN信息
+        """
+        now = time.monotonic()
+        cache = self._query_cache
+        with self._query_cache_lock:
+            cache[sn_code] = (item_data, now)
+            cache.move_to_end(sn_code)
+            # 条目按写入时间排列，过期条目总在最前面
+            while cache and (
+                len(cache) > self.QUERY_CACHE_SIZE
+                or now - next(iter(cache.values()))[1] >= self.QUERY_CACHE_TTL
+            ):
+                cache.popitem(last=False)
+    
+    def _forget_queries(self, sn_codes: Iterable[str]) -> None:
+        """
+        移除SN查询缓存
+        
+        Args:
+            sn_codes: SN编码
+        """
+        with self._query_cache_lock:
+            for sn_code in sn_codes:
+                self._query_cache.pop(sn_code, None)
+    
+    def _create_order(self, items: List[Dict[str, Any]]) -> str:
         """
         创建出货单
         
         Args:
-            item_data: 商品信息
+            items: 商品信息列表
             
         Returns:
             出货单号(soNo)
@@ -141,7 +365,7 @@ class PickingProcessor:
         order_data = {
             "customerCode": None,
             "customerName": None,
-            "items": [item_data],
+            "items": items,
             "soType": "YHJCK",
             "whCode": None,
             "whName": None
@@ -149,7 +373,7 @@ class PickingProcessor:
         
         data = {"data": json.dumps(order_data)}
         response = self.auth.post(url, data=data)
-        result = response.json()
+        result = orjson.loads(response.content)
         
         so_no = result.get("data", "")
         if so_no:
@@ -181,7 +405,7 @@ class PickingProcessor:
         
         data = {"data": json.dumps(query_data)}
         response = self.auth.post(url, data=data)
-        result = response.json()
+        result = orjson.loads(response.content)
         
         return result.get("success", False) or "data" in result
     
@@ -205,6 +429,6 @@ class PickingProcessor:
         
         data = {"data": json.dumps(pick_data)}
         response = self.auth.post(url, data=data)
-        result = response.json()
+        result = orjson.loads(response.content)
         
         return result.get("success", False)
@@ -2,24 +2,73 @@
 
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional
 from urllib.parse import urlencode
-from dateutil.relativedelta import relativedelta
+
+import orjson
 
 from ..auth.logistics import LogisticsAuth
-from ..models.sn_record import ShippingRecord
+from ..models.sn_record import ShippingRecord, BatchResult
 
 logger = logging.getLogger(__name__)
 
+# 查询参数中的时间格式
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 承运商名称 -> 承运商代码
+_CARRIER_MAP: Mapping[str, str] = MappingProxyType({
+    "顺丰速运": "shunfeng",
+    "": ""
+})
+
+# 发货明细行中需固定覆盖的字段
+_ALLOC_ROW_OVERRIDES: Mapping[str, str] = MappingProxyType({
+    "id": "1",
+    "rowId": "1",
+    "_index": "1"
+})
+
+# VAS数据模板（发货时复制并填入出货单号等字段）
+_SELF_PICKUP_VAS: Mapping[str, Any] = MappingProxyType({
+    "tpType": "3",
+    "carrierName": "",
+    "carrierCode": "",
+    "allocateInWhNames": None,
+    "transitWarehouse": None,
+    "cttaName": None,
+    "logisticType": None,
+    "def1": None,
+    "weight": None,
+    "cubic": None,
+    "insuredValue": None,
+    "contactTel": None,
+    "tpNo": None,
+    "packageNo": None,
+    "snCode": None,
+    "soNo": None
+})
+
+_SHIPPING_VAS: Mapping[str, Any] = MappingProxyType(dict(_SELF_PICKUP_VAS, tpType="0"))
+
 
 class ShippingProcessor:
     """发货处理器"""
     
+    # 批量发货时同时进行的记录数量
+    DEFAULT_CONCURRENCY = 16
+    # 查询待发货数据时每轮并发预取的页数
+    PAGE_PREFETCH = 8
+    # 查询待发货数据的最大页数
+    MAX_PAGES = 100
+    
     def __init__(
         self,
         auth: LogisticsAuth,
-        self_pickup_staff: Optional[List[str]] = None
+        self_pickup_staff: Optional[List[str]] = None,
+        concurrency: int = DEFAULT_CONCURRENCY
     ):
         """
         初始化发货处理器
@@ -27,9 +76,11 @@ class ShippingProcessor:
         Args:
             auth: 物流系统认证器
             self_pickup_staff: 自提人员名单
+            concurrency: 批量发货并发数
         """
         self.auth = auth
         self.self_pickup_staff = set(self_pickup_staff or [])
+        self.concurrency = max(1, concurrency)
     
     def get_pending_shipments(
         self,
@@ -47,62 +98,77 @@ class ShippingProcessor:
         # 计算时间范围
         now = datetime.now()
         end_time = datetime(now.year, now.month, now.day, 23, 59, 29)
-        start_time = (now - relativedelta(days=days_back)).replace(
+        start_time = (now - timedelta(days=days_back)).replace(
             hour=0, minute=0, second=0, microsecond=0
         )
         
         all_records = []
-        current_page = 1
         
-        while True:
-            params = self._build_query_params(start_time, end_time, current_page)
-            
-            try:
-                # 先获取总数概况
-                collect_url = "/wms-web/oubweb/outboundSoController/collectSoOrderGroupByStatus.shtml"
-                self.auth.post(collect_url, data=params)
-                
-                # 获取列表数据
-                query_url = "/wms-web/oubweb/outboundSoController/query.shtml"
-                query_string = urlencode(params)
-                full_url = f"{query_url}?{query_string}"
+        # 查询参数只有页码随翻页变化：其余参数编码一次，各页只追加页码
+        params = self._build_query_params(
+            start_time.strftime(_TIME_FORMAT),
+            end_time.strftime(_TIME_FORMAT),
+            1
+        )
+        del params["page.currentPage"]
+        base_query = urlencode(params)
+        
+        try:
+            # 先获取总数概况（与分页无关，只需请求一次；会话已设置表单Content-Type）
+            collect_url = "/wms-web/oubweb/outboundSoController/collectSoOrderGroupByStatus.shtml"
+            self.auth.post(collect_url, data=f"{base_query}&page.currentPage=1")
+        except Exception as e:
+            logger.error(f"获取待发货数据失败: {e}")
+            return all_records
+        
+        query_url = "/wms-web/oubweb/outboundSoController/query.shtml"
+        
+        def fetch_page(page: int) -> List[Dict[str, Any]]:
+            response = self.auth.get(f"{query_url}?{base_query}&page.currentPage={page}")
+            return orjson.loads(response.content).get("rows", [])
+        
+        # 每轮并发预取 PAGE_PREFETCH 页，遇到空页即结束，之后的预取结果丢弃
+        finished = False
+        with ThreadPoolExecutor(
+            max_workers=self.PAGE_PREFETCH,
+            thread_name_prefix="shipping-query"
+        ) as executor:
+            for first_page in range(1, self.MAX_PAGES + 1, self.PAGE_PREFETCH):
+                pages = range(first_page, min(first_page + self.PAGE_PREFETCH, self.MAX_PAGES + 1))
                 
-                response = self.auth.get(full_url)
-                result = response.json()
+                try:
+                    for rows in executor.map(fetch_page, pages):
+                        if not rows:
+                            finished = True
+                            break
+                        all_records.extend(rows)
+                except Exception as e:
+                    logger.error(f"获取待发货数据失败: {e}")
+                    finished = True
                 
-                rows = result.get("rows", [])
-                if not rows:
+                if finished:
                     break
-                
-                all_records.extend(rows)
-                current_page += 1
-                
+            else:
                 # 安全限制
-                if current_page > 100:
-                    logger.warning("查询页数超过100，可能存在数据异常")
-                    break
-                    
-            except Exception as e:
-                logger.error(f"获取待发货数据失败: {e}")
-                break
+                logger.warning(f"查询页数超过{self.MAX_PAGES}，可能存在数据异常")
         
         logger.info(f"获取到 {len(all_records)} 条待发货记录")
         return all_records
     
     def _build_query_params(
         self,
-        start_time: datetime,
-        end_time: datetime,
+        order_time_from: str,
+        order_time_to: str,
         page: int
     ) -> Dict[str, str]:
-        """构建查询参数"""
+        """构建查询参数（时间为已格式化的字符串）"""
         return {
             "soNo": "",
             "workOrderNo": "",
             "omsOrderNo": "",
             "soType": "",
-            "orderTimeFm": start_time.strftime("%Y-%m-%d %H:%M:%S"),
-            "orderTimeTo": end_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "orderTimeFm": order_time_from,
+            "orderTimeTo": order_time_to,
             "skuBrand": "",
             "tpyeCode": "",
             "ownerName": "",
@@ -125,7 +191,8 @@ class ShippingProcessor:
     def ship(
         self,
         row_data: Dict[str, Any],
-        customer_name: Optional[str] = None
+        customer_name: Optional[str] = None,
+        is_self_pickup: Optional[bool] = None
     ) -> ShippingRecord:
         """
         执行发货
@@ -133,6 +200,7 @@ class ShippingProcessor:
         Args:
             row_data: 发货数据行
             customer_name: 客户姓名
+            is_self_pickup: 是否自提，未指定时按客户姓名是否在自提人员名单中判断
             
         Returns:
             发货记录
@@ -140,7 +208,7 @@ class ShippingProcessor:
         sn_code = row_data.get("invSn", "")
         so_no = row_data.get("soNo", "")
         
-        record = ShippingRecord(
+        record = ShippingRecord.model_construct(
             sn_code=sn_code,
             so_no=so_no,
             customer_name=customer_name,
@@ -149,7 +217,8 @@ class ShippingProcessor:
         
         try:
             # 判断是否自提
-            is_self_pickup = customer_name in self.self_pickup_staff
+            if is_self_pickup is None:
+                is_self_pickup = customer_name in self.self_pickup_staff
             record.is_self_pickup = is_self_pickup
             
             # 构建VAS数据
@@ -162,23 +231,17 @@ class ShippingProcessor:
                 vas_data = self._build_shipping_vas(so_no, "", "")
                 record.message = f"外发: {customer_name or '未知'}"
             
-            # 准备行数据
-            row_copy = row_data.copy()
-            row_copy["id"] = "1"
-            row_copy["rowId"] = "1"
-            row_copy["_index"] = "1"
-            
-            # 执行发货请求
+            # 执行发货请求（明细行覆盖固定字段后直接序列化，不修改原数据）
             url = "/wms-web/oubweb/outboundShippmentController/shipmentByAllocListNew.shtml"
             data = {
                 "vasSave": json.dumps(vas_data),
-                "allocDetails": json.dumps([row_copy]),
+                "allocDetails": json.dumps([{**row_data, **_ALLOC_ROW_OVERRIDES}]),
                 "allocateInWh": '""',
                 "soNos": ""
             }
             
             response = self.auth.post(url, data=data)
-            result = response.json()
+            result = orjson.loads(response.content)
             
             if result.get("success", False):
                 record.success = True
@@ -198,28 +261,38 @@ class ShippingProcessor:
         self,
         records: List[Dict[str, Any]],
         customer_name_map: Optional[Dict[str, str]] = None
-    ) -> List[ShippingRecord]:
+    ) -> BatchResult[ShippingRecord]:
         """
         批量发货
         
+        各记录的发货请求互不依赖，按 concurrency 限制并发执行，
+        返回结果与输入顺序一致
+        
         Args:
             records: 发货数据列表
             customer_name_map: SN到客户姓名的映射
             
         Returns:
-            发货记录列表
+            发货记录列表（含成功数 success_count）
         """
-        results = []
         total = len(records)
         name_map = customer_name_map or {}
+        # 自提SN集合只需按名单计算一次，逐行判断时直接查SN
+        pickup_sns = {
+            sn for sn, name in name_map.items() if name in self.self_pickup_staff
+        }
         
-        for idx, row in enumerate(records, 1):
+        def ship_one(idx: int, row: Dict[str, Any]) -> ShippingRecord:
             sn_code = row.get("invSn", "")
-            customer_name = name_map.get(sn_code)
             
             logger.info(f"[{idx}/{total}] 处理发货: {sn_code}")
-            record = self.ship(row, customer_name)
-            results.append(record)
+            return self.ship(row, name_map.get(sn_code), sn_code in pickup_sns)
+        
+        with ThreadPoolExecutor(
+            max_workers=min(self.concurrency, total) or 1,
+            thread_name_prefix="shipping"
+        ) as executor:
+            results = list(executor.map(ship_one, range(1, total + 1), records))
         
         # 统计
         success_count = sum(1 for r in results if r.success)
@@ -231,28 +304,11 @@ class ShippingProcessor:
             f"(自提: {self_pickup_count}, 外发: {shipping_count})"
         )
         
-        return results
+        return BatchResult(results, success_count)
     
     def _build_self_pickup_vas(self, so_no: str) -> List[Dict[str, Any]]:
         """构建自提VAS数据"""
-        return [{
-            "tpType": "3",
-            "carrierName": "",
-            "carrierCode": "",
-            "allocateInWhNames": None,
-            "transitWarehouse": None,
-            "cttaName": None,
-            "logisticType": None,
-            "def1": None,
-            "weight": None,
-            "cubic": None,
-            "insuredValue": None,
-            "contactTel": None,
-            "tpNo": None,
-            "packageNo": None,
-            "snCode": None,
-            "soNo": so_no
-        }]
+        return [dict(_SELF_PICKUP_VAS, soNo=so_no)]
     
     def _build_shipping_vas(
         self,
@@ -261,26 +317,10 @@ class ShippingProcessor:
         carrier: str
     ) -> List[Dict[str, Any]]:
         """构建外发VAS数据"""
-        carrier_map = {
-            "顺丰速运": "shunfeng",
-            "": ""
-        }
-        
-        return [{
-            "tpType": "0",
-            "carrierName": carrier or "顺丰速运",
-            "carrierCode": carrier_map.get(carrier, "shunfeng"),
-            "allocateInWhNames": None,
-            "transitWarehouse": None,
-            "cttaName": None,
-            "logisticType": None,
-            "def1": None,
-            "weight": None,
-            "cubic": None,
-            "insuredValue": None,
-            "contactTel": None,
-            "tpNo": tracking_no,
-            "packageNo": None,
-            "snCode": None,
-            "soNo": so_no
-        }]
+        return [dict(
+            _SHIPPING_VAS,
+            carrierName=carrier or "顺丰速运",
+            carrierCode=_CARRIER_MAP.get(carrier, "shunfeng"),
+            tpNo=tracking_no,
+            soNo=so_no
+        )]
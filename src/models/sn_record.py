@@ -1,10 +1,12 @@
 """SN记录数据模型"""
 
 from enum import Enum
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import Iterable, List, Optional, TypeVar
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 
+RecordT = TypeVar("RecordT")
+
 
 class ProductType(str, Enum):
     """产品类型"""
@@ -13,7 +15,9 @@ class ProductType(str, Enum):
 
 
 class SNRecord(BaseModel):
-    """SN记录模型"""
+    """SN记录模型（解析后只读）"""
+    
+    model_config = ConfigDict(extra="ignore", frozen=True)
     
     sn_code: str = Field(..., description="SN编码")
     product_type: ProductType = Field(..., description="产品类型")
@@ -21,23 +25,13 @@ class SNRecord(BaseModel):
     customer_name: Optional[str] = Field(None, description="客户姓名")
     status: Optional[str] = Field(None, description="状态")
     created_at: Optional[datetime] = Field(None, description="创建时间")
-    
-    class Config:
-        """Pydantic配置"""
-        json_schema_extra = {
-            "example": {
-                "sn_code": "55A3DXX-A036819",
-                "product_type": "user_machine",
-                "order_no": "SO20241008123000",
-                "customer_name": "张三",
-                "status": "completed"
-            }
-        }
 
 
 class PickingRecord(BaseModel):
     """拣货记录模型"""
     
+    model_config = ConfigDict(extra="ignore")
+    
     sn_code: str = Field(..., description="SN编码")
     so_no: str = Field(..., description="出库单号")
     success: bool = Field(False, description="是否成功")
@@ -48,6 +42,8 @@ class PickingRecord(BaseModel):
 class ShippingRecord(BaseModel):
     """发货记录模型"""
     
+    model_config = ConfigDict(extra="ignore")
+    
     sn_code: str = Field(..., description="SN编码")
     so_no: str = Field(..., description="出库单号")
     customer_name: Optional[str] = Field(None, description="客户姓名")
@@ -57,3 +53,18 @@ class ShippingRecord(BaseModel):
     success: bool = Field(False, description="是否成功")
     message: Optional[str] = Field(None, description="操作消息")
     shipped_at: Optional[datetime] = Field(None, description="发货时间")
+
+
+class BatchResult(List[RecordT]):
+    """批量处理结果：记录列表，附带处理时已统计好的成功数"""
+    
+    def __init__(self, records: Iterable[RecordT] = (), success_count: int = 0):
+        """
+        初始化批量处理结果
+        
+        Args:
+            records: 处理记录
+            success_count: 成功数量
+        """
+        super().__init__(records)
+        self.success_count = success_count
@@ -1,13 +1,29 @@
 """工单数据模型"""
 
 from typing import Optional, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 
 
 class WorkOrder(BaseModel):
     """工单模型"""
     
+    model_config = ConfigDict(
+        extra="ignore",
+        frozen=True,
+        json_schema_extra={
+            "example": {
+                "order_id": "WO202410080001",
+                "order_name": "维修工单",
+                "sn_code": "55A3DXX-A036819",
+                "brand": "ASD",
+                "status": "completed",
+                "customer_name": "张三",
+                "mobile": "13800138000"
+            }
+        }
+    )
+    
     order_id: str = Field(..., description="工单ID")
     order_name: Optional[str] = Field(None, description="工单名称")
     sn_code: Optional[str] = Field(None, description="SN编码")
@@ -20,20 +36,6 @@ class WorkOrder(BaseModel):
     agency: Optional[str] = Field(None, description="代理商")
     created_at: Optional[datetime] = Field(None, description="创建时间")
     completed_at: Optional[datetime] = Field(None, description="完成时间")
-    
-    class Config:
-        """Pydantic配置"""
-        json_schema_extra = {
-            "example": {
-                "order_id": "WO202410080001",
-                "order_name": "维修工单",
-                "sn_code": "55A3DXX-A036819",
-                "brand": "ASD",
-                "status": "completed",
-                "customer_name": "张三",
-                "mobile": "13800138000"
-            }
-        }
 
 
 class WorkOrderQueryResult(BaseModel):
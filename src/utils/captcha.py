@@ -1,17 +1,41 @@
 """验证码识别模块 - 使用百度OCR API"""
 
+import hashlib
 import os
+import tempfile
+import time
 import requests
-import base64
+from base64 import b64encode
+from pathlib import Path
 from typing import Optional
 import logging
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
 
+def _token_cache_path() -> Path:
+    """access_token 缓存文件路径（遵循 XDG_CACHE_HOME）"""
+    cache_home = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "hn-automation" / "baidu_ocr.json"
+
+
 class CaptchaRecognizer:
     """验证码识别器 - 基于百度OCR"""
     
+    # OCR接口请求头
+    _FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+    # 识别结果中需要去除的空白字符
+    _STRIP = str.maketrans("", "", " \n\r\t")
+    # access_token 提前失效的余量（秒）
+    TOKEN_EXPIRY_MARGIN = 300
+    # 响应未返回 expires_in 时使用的默认有效期（秒，百度令牌有效期为30天）
+    DEFAULT_TOKEN_TTL = 30 * 24 * 3600
+    # 令牌无效或已过期的错误码
+    INVALID_TOKEN_CODES = frozenset((110, 111))
+    
     def __init__(self, api_key: Optional[str] = None, secret_key: Optional[str] = None):
         """
         初始化验证码识别器
@@ -23,6 +47,19 @@ class CaptchaRecognizer:
         self.api_key = api_key or os.getenv("BAIDU_OCR_API_KEY")
         self.secret_key = secret_key or os.getenv("BAIDU_OCR_SECRET_KEY")
         self._access_token: Optional[str] = None
+        self._token_expires_at = 0.0
+        # 缓存文件中只保存 API Key 的指纹，用于确认令牌属于当前 Key
+        self._key_fingerprint = (
+            hashlib.sha256(self.api_key.encode()).hexdigest() if self.api_key else ""
+        )
+        
+        # 复用长连接，避免每次识别都重新建立TLS连接
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=4,
+            max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504))
+        ))
         
         if not self.api_key or not self.secret_key:
             logger.warning("百度OCR API Key 或 Secret Key 未配置，验证码识别功能将不可用")
@@ -34,12 +71,16 @@ class CaptchaRecognizer:
         Returns:
             access_token 或 None
         """
-        if self._access_token:
+        if self._access_token and time.time() < self._token_expires_at:
             return self._access_token
             
         if not self.api_key or not self.secret_key:
             logger.error("百度OCR API Key 或 Secret Key 未配置")
             return None
+        
+        # 优先使用上次进程缓存在磁盘上的令牌（有效期30天）
+        if self._load_cached_token():
+            return self._access_token
             
         try:
             url = "https://aip.baidubce.com/oauth/2.0/token"
@@ -48,20 +89,74 @@ class CaptchaRecognizer:
                 "client_id": self.api_key,
                 "client_secret": self.secret_key
             }
-            response = requests.post(url, params=params, timeout=10)
-            result = response.json()
+            response = self._session.post(url, params=params, timeout=10)
+            result = orjson.loads(response.content)
             
             if "access_token" in result:
                 self._access_token = result["access_token"]
+                self._token_expires_at = (
+                    time.time() + (result.get("expires_in") or self.DEFAULT_TOKEN_TTL)
+                    - self.TOKEN_EXPIRY_MARGIN
+                )
+                self._save_cached_token()
                 logger.debug("成功获取百度OCR access_token")
                 return self._access_token
             else:
-                logger.error(f"获取access_token失败: {result}")
+                logger.error("获取access_token失败: %s", result)
                 return None
         except Exception as e:
-            logger.error(f"获取access_token异常: {e}")
+            logger.error("获取access_token异常: %s", e)
             return None
     
+    def _load_cached_token(self) -> bool:
+        """
+        从磁盘缓存加载未过期且属于当前 API Key 的令牌
+        
+        Returns:
+            是否加载成功
+        """
+        try:
+            cached = orjson.loads(_token_cache_path().read_bytes())
+            if cached["key_sha256"] != self._key_fingerprint or time.time() >= cached["expires_at"]:
+                return False
+            self._access_token = cached["token"]
+            self._token_expires_at = cached["expires_at"]
+            logger.debug("使用缓存的百度OCR access_token")
+            return True
+        except Exception:
+            return False
+    
+    def _save_cached_token(self) -> None:
+        """将令牌写入磁盘缓存（先写临时文件再替换，权限0600仅当前用户可读写）"""
+        cache_file = _token_cache_path()
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, suffix=".tmp")
+            try:
+                # mkstemp 已按0600创建，显式设置以免受平台差异影响
+                os.fchmod(fd, 0o600)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(orjson.dumps({
+                        "key_sha256": self._key_fingerprint,
+                        "token": self._access_token,
+                        "expires_at": self._token_expires_at
+                    }))
+                os.replace(tmp_path, cache_file)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            logger.debug("缓存access_token失败: %s", e)
+    
+    def _invalidate_token(self) -> None:
+        """清除内存和磁盘上已失效的令牌，下次使用时重新获取"""
+        self._access_token = None
+        self._token_expires_at = 0.0
+        try:
+            _token_cache_path().unlink(missing_ok=True)
+        except OSError as e:
+            logger.debug("删除access_token缓存失败: %s", e)
+    
     def recognize(self, image_bytes: bytes) -> Optional[str]:
         """
         识别验证码
@@ -69,6 +164,20 @@ class CaptchaRecognizer:
         Args:
             image_bytes: 验证码图片字节
             
+        Returns:
+            识别的验证码文本，失败返回None
+        """
+        # 图片转Base64（直接使用字节，由requests在表单编码时处理，省去一次解码）
+        return self._recognize_b64(b64encode(image_bytes))
+    
+    def _recognize_b64(self, image_base64: bytes, refresh_token: bool = True) -> Optional[str]:
+        """
+        识别已编码为Base64的验证码
+        
+        Args:
+            image_base64: Base64编码的验证码图片
+            refresh_token: 令牌失效时是否清除缓存并重新获取令牌重试一次
+            
         Returns:
             识别的验证码文本，失败返回None
         """
@@ -77,14 +186,8 @@ class CaptchaRecognizer:
             return None
         
         try:
-            # 图片转Base64
-            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-            
             # 调用百度OCR高精度版接口
             url = "https://aip.baidubce.com/rest/2.0/ocr/v1/accurate_basic"
-            headers = {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
             data = {
                 'access_token': access_token,
                 'image': image_base64,
@@ -92,22 +195,29 @@ class CaptchaRecognizer:
                 'detect_direction': 'false'
             }
             
-            response = requests.post(url, headers=headers, data=data, timeout=10)
-            result_json = response.json()
+            response = self._session.post(url, headers=self._FORM_HEADERS, data=data, timeout=10)
+            result_json = orjson.loads(response.content)
             
             if 'words_result' in result_json and len(result_json['words_result']) > 0:
-                # 提取识别结果，去除空格
-                recognized_text = ''.join([item['words'] for item in result_json['words_result']])
-                recognized_text = recognized_text.replace(" ", "").replace("\n", "")
-                logger.debug(f"验证码识别结果: {recognized_text}")
+                # 提取识别结果，一次性去除空白字符
+                recognized_text = ''.join(
+                    item['words'] for item in result_json['words_result']
+                ).translate(self._STRIP)
+                logger.debug("验证码识别结果: %s", recognized_text)
                 return recognized_text
+            elif result_json.get('error_code') in self.INVALID_TOKEN_CODES:
+                logger.warning("百度OCR access_token已失效: %s", result_json.get('error_msg'))
+                self._invalidate_token()
+                if refresh_token:
+                    return self._recognize_b64(image_base64, refresh_token=False)
+                return None
             else:
                 error_msg = result_json.get('error_msg', '未知错误')
-                logger.warning(f"验证码识别失败: {error_msg}")
+                logger.warning("验证码识别失败: %s", error_msg)
                 return None
                 
         except Exception as e:
-            logger.error(f"验证码识别异常: {e}")
+            logger.error("验证码识别异常: %s", e)
             return None
     
     def recognize_with_retry(self, image_bytes: bytes, expected_length: int = 4, max_retry: int = 3) -> Optional[str]:
@@ -122,9 +232,12 @@ class CaptchaRecognizer:
         Returns:
             识别的验证码文本，失败返回None
         """
+        # 只编码一次，每次重试复用
+        image_base64 = b64encode(image_bytes)
+        
         for attempt in range(max_retry):
-            result = self.recognize(image_bytes)
+            result = self._recognize_b64(image_base64)
             if result and len(result) == expected_length:
                 return result
-            logger.warning(f"验证码识别尝试 {attempt + 1}/{max_retry} 失败，结果: {result}")
+            logger.warning("验证码识别尝试 %d/%d 失败，结果: %s", attempt + 1, max_retry, result)
         return None
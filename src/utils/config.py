@@ -1,11 +1,88 @@
 """配置管理模块"""
 
+import logging
+import math
 import os
+import orjson
 import yaml
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 
+# libyaml可用时使用C实现的安全加载器，语义与 yaml.safe_load 一致
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+logger = logging.getLogger(__name__)
+
+# 凭证配置名 -> 环境变量前缀（{前缀}_USERNAME / {前缀}_PASSWORD）
+_CREDENTIAL_ENV_PREFIXES = (
+    ("workorder", "WORKORDER"),
+    ("asd", "ASD"),
+    ("logistics", "LOGISTICS"),
+)
+
+# 配置JSON缓存的格式版本，旧版本缓存可能包含有损转换的值，不再使用
+_CACHE_VERSION = 2
+
+
+@dataclass(frozen=True, slots=True)
+class ResolvedConfig:
+    """解析后的只读配置（启动时构建一次，运行期间直接按属性访问）"""
+    
+    # 系统
+    log_path: Optional[str]
+    log_level: str
+    interval: int
+    days_back: int
+    picking_concurrency: int
+    shipping_concurrency: int
+    picking_group_size: int
+    
+    # 各系统基础URL
+    workorder_base: str
+    asd_base: str
+    logistics_base: str
+    
+    # 文件路径
+    cookie_path: str
+    captcha_path: Optional[str]
+    user_machine_csv: str
+    user_board_csv: str
+    
+    # 凭证、业务与通知
+    credentials: Dict[str, Any]
+    self_pickup_staff: List[str]
+    notification: Dict[str, Any]
+
+
+def _is_json_native(value: Any) -> bool:
+    """
+    检查配置值能否无损地往返JSON
+    
+    YAML中的日期、集合、二进制、非字符串键及 inf/nan 转为JSON后类型会改变，
+    包含这些值的配置不写入缓存
+    
+    Args:
+        value: 配置值
+        
+    Returns:
+        是否只包含JSON原生类型
+    """
+    if value is None or isinstance(value, (str, bool, int)):
+        return True
+    if isinstance(value, float):
+        return math.isfinite(value)
+    if isinstance(value, list):
+        return all(map(_is_json_native, value))
+    if isinstance(value, dict):
+        return all(
+            isinstance(key, str) and _is_json_native(item)
+            for key, item in value.items()
+        )
+    return False
+
 
 class Config:
     """配置管理类"""
@@ -20,51 +97,105 @@ class Config:
         # 加载环境变量
         load_dotenv()
         
-        # 加载YAML配置
-        self._config = self._load_yaml(config_path)
+        # 加载YAML配置（优先使用JSON缓存）
+        self._config = self._load_cached(config_path)
         
         # 从环境变量覆盖敏感配置
         self._load_from_env()
+        
+        # 点号路径 -> 配置值（包含中间层级），供 get 直接查找
+        self._flat: Dict[str, Any] = {}
+        self._flatten(self._config)
+    
+    def _load_cached(self, path: str) -> Dict[str, Any]:
+        """
+        加载配置，使用与YAML同目录的JSON缓存避免每次启动重新解析YAML
+        
+        缓存记录了YAML文件的修改时间，不一致时重新解析并更新缓存
+        
+        Args:
+            path: YAML配置文件路径
+            
+        Returns:
+            配置字典
+        """
+        config_file = Path(path)
+        if not config_file.exists():
+            return {}
+        
+        cache_file = config_file.with_name(config_file.name + ".json")
+        mtime_ns = config_file.stat().st_mtime_ns
+        
+        try:
+            cached = orjson.loads(cache_file.read_bytes())
+            if cached.get("mtime_ns") == mtime_ns and cached.get("version") == _CACHE_VERSION:
+                return cached["config"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+        
+        config = self._load_yaml(path)
+        if not _is_json_native(config):
+            logger.debug("配置包含JSON无法无损表示的值，不写入缓存")
+            return config
+        
+        try:
+            cache_file.write_bytes(orjson.dumps({
+                "version": _CACHE_VERSION,
+                "mtime_ns": mtime_ns,
+                "config": config
+            }))
+        except (OSError, TypeError) as e:
+            # 配置目录只读或整数超出JSON范围时不缓存
+            logger.debug("配置缓存写入失败: %s", e)
+        
+        return config
     
     def _load_yaml(self, path: str) -> Dict[str, Any]:
-        """加载YAML配置文件"""
+        """加载YAML配置文件（优先使用libyaml的C解析器）"""
         config_file = Path(path)
         if config_file.exists():
-            with open(config_file, "r", encoding="utf-8") as f:
-                return yaml.safe_load(f) or {}
+            with open(config_file, "rb") as f:
+                return yaml.load(f, Loader=_YAML_LOADER) or {}
         return {}
     
     def _load_from_env(self):
         """从环境变量加载配置"""
-        # 工单系统
-        if os.getenv("WORKORDER_USERNAME"):
-            self._config.setdefault("credentials", {}).setdefault("workorder", {})
-            self._config["credentials"]["workorder"]["username"] = os.getenv("WORKORDER_USERNAME")
-            self._config["credentials"]["workorder"]["password"] = os.getenv("WORKORDER_PASSWORD")
-        
-        # ASD系统
-        if os.getenv("ASD_USERNAME"):
-            self._config.setdefault("credentials", {}).setdefault("asd", {})
-            self._config["credentials"]["asd"]["username"] = os.getenv("ASD_USERNAME")
-            self._config["credentials"]["asd"]["password"] = os.getenv("ASD_PASSWORD")
-        
-        # 物流系统
-        if os.getenv("LOGISTICS_USERNAME"):
-            self._config.setdefault("credentials", {}).setdefault("logistics", {})
-            self._config["credentials"]["logistics"]["username"] = os.getenv("LOGISTICS_USERNAME")
-            self._config["credentials"]["logistics"]["password"] = os.getenv("LOGISTICS_PASSWORD")
-        
-        # 自提人员列表
-        if os.getenv("SELF_PICKUP_STAFF"):
-            staff_list = [s.strip() for s in os.getenv("SELF_PICKUP_STAFF").split(",")]
+        env = os.environ.get
+        
+        # 各系统凭证：工单系统、ASD系统、物流系统
+        for system, prefix in _CREDENTIAL_ENV_PREFIXES:
+            username = env(f"{prefix}_USERNAME")
+            if username:
+                creds = self._config.setdefault("credentials", {}).setdefault(system, {})
+                creds["username"] = username
+                creds["password"] = env(f"{prefix}_PASSWORD")
+        
+        # 自提人员列表（逗号分隔，忽略空白和空项）
+        staff = env("SELF_PICKUP_STAFF")
+        if staff:
+            staff_list = list(filter(None, map(str.strip, staff.split(","))))
             self._config.setdefault("business", {})["self_pickup_staff"] = staff_list
         
         # PushPlus 通知配置
-        pushplus_token = os.getenv("PUSHPLUS_TOKEN")
+        pushplus_token = env("PUSHPLUS_TOKEN")
         if pushplus_token:
-            self._config.setdefault("notification", {})
-            self._config["notification"]["token"] = pushplus_token
-            self._config["notification"]["enabled"] = os.getenv("PUSHPLUS_ENABLED", "true").lower() == "true"
+            notification = self._config.setdefault("notification", {})
+            notification["token"] = pushplus_token
+            notification["enabled"] = env("PUSHPLUS_ENABLED", "true").lower() == "true"
+    
+    def _flatten(self, node: Dict[str, Any], prefix: str = "") -> None:
+        """
+        将嵌套配置展开为点号路径索引
+        
+        Args:
+            node: 配置节点
+            prefix: 当前节点的路径前缀
+        """
+        for k, value in node.items():
+            path = f"{prefix}{k}"
+            self._flat[path] = value
+            if isinstance(value, dict):
+                self._flatten(value, path + ".")
     
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -77,14 +208,7 @@ class Config:
         Returns:
             配置值
         """
-        keys = key.split(".")
-        value = self._config
-        for k in keys:
-            if isinstance(value, dict) and k in value:
-                value = value[k]
-            else:
-                return default
-        return value
+        return self._flat.get(key, default)
     
     @property
     def system(self) -> Dict[str, Any]:
@@ -115,15 +239,36 @@ class Config:
     def notification(self) -> Dict[str, Any]:
         """通知配置"""
         return self._config.get("notification", {})
+    
+    def resolve(self) -> ResolvedConfig:
+        """
+        将运行期间用到的配置项一次性解析为只读对象
+        
+        Returns:
+            解析后的配置
+        """
+        return ResolvedConfig(
+            log_path=self.get("paths.log"),
+            log_level=self.get("system.log_level", "INFO"),
+            interval=self.get("system.interval", 30),
+            days_back=self.get("date_range.days_back", 29),
+            picking_concurrency=self.get("concurrency.picking", 16),
+            shipping_concurrency=self.get("concurrency.shipping", 16),
+            picking_group_size=self.get("picking.group_size", 0),
+            workorder_base=self.get("urls.workorder.base"),
+            asd_base=self.get("urls.asd.base"),
+            logistics_base=self.get("urls.logistics.base"),
+            cookie_path=self.get("paths.cookies"),
+            captcha_path=self.get("paths.captcha"),
+            user_machine_csv=self.get("paths.user_machine_csv"),
+            user_board_csv=self.get("paths.user_board_csv"),
+            credentials=self.credentials,
+            self_pickup_staff=self.self_pickup_staff,
+            notification=self.notification
+        )
 
 
-# 全局配置实例
-_config_instance: Optional[Config] = None
-
-
-def get_config(config_path: str = "config/settings.yaml") -> Config:
-    """获取全局配置实例"""
-    global _config_instance
-    if _config_instance is None:
-        _config_instance = Config(config_path)
-    return _config_instance
+@lru_cache(maxsize=4)
+def get_config(config_path: str = "config/settings.yaml") -> ResolvedConfig:
+    """获取全局配置实例（按配置文件路径缓存）"""
+    return Config(config_path).resolve()
@@ -2,7 +2,8 @@
 
 import base64
 from datetime import datetime
-from Crypto.Cipher import AES
+from functools import lru_cache
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
 
 class AESCipher:
@@ -20,6 +21,8 @@ class AESCipher:
         """
         self.key = key.encode("utf-8")
         self.iv = iv.encode("utf-8")
+        # 算法和模式对象可重复使用，每次加解密只需新建上下文
+        self._cipher = Cipher(algorithms.AES(self.key), modes.CBC(self.iv))
     
     @staticmethod
     def _zero_pad(data: bytes) -> bytes:
@@ -32,8 +35,8 @@ class AESCipher:
         Returns:
             填充后的数据
         """
-        pad_len = AES.block_size - (len(data) % AES.block_size)
-        return data + bytes([0] * pad_len)
+        # 长度恰好为块大小整数倍时仍补一整块，与现有密文保持一致
+        return data + bytes(AESCipher.BLOCK_SIZE - len(data) % AESCipher.BLOCK_SIZE)
     
     def encrypt(self, plaintext: str) -> str:
         """
@@ -46,8 +49,8 @@ class AESCipher:
             Base64编码的密文
         """
         padded_text = self._zero_pad(plaintext.encode("utf-8"))
-        cipher = AES.new(self.key, AES.MODE_CBC, self.iv)
-        encrypted = cipher.encrypt(padded_text)
+        encryptor = self._cipher.encryptor()
+        encrypted = encryptor.update(padded_text) + encryptor.finalize()
         return base64.b64encode(encrypted).decode("utf-8")
     
     def decrypt(self, ciphertext: str) -> str:
@@ -61,8 +64,8 @@ class AESCipher:
             明文
         """
         encrypted = base64.b64decode(ciphertext)
-        cipher = AES.new(self.key, AES.MODE_CBC, self.iv)
-        decrypted = cipher.decrypt(encrypted)
+        decryptor = self._cipher.decryptor()
+        decrypted = decryptor.update(encrypted) + decryptor.finalize()
         # 去除零填充
         return decrypted.rstrip(b"\x00").decode("utf-8")
 
@@ -109,6 +112,19 @@ class PasswordEncryptor:
         Returns:
             加密后的密码
         """
-        key = self._generate_key(date)
-        cipher = AESCipher(key, self.iv)
-        return cipher.encrypt(password)
+        return self._cipher_for(self._generate_key(date), self.iv).encrypt(password)
+    
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _cipher_for(key: str, iv: str) -> AESCipher:
+        """
+        获取指定密钥的加密器（密钥按日期变化，同一天内复用）
+        
+        Args:
+            key: 加密密钥
+            iv: 初始化向量
+            
+        Returns:
+            AES加密器
+        """
+        return AESCipher(key, iv)
@@ -1,10 +1,50 @@
 """日志配置模块"""
 
+import atexit
 import logging
+import queue
 import sys
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional, Tuple
+
+# 日志格式中未使用线程/进程信息，跳过 LogRecord 中这些字段的采集
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+
+# 各日志记录器对应的后台写入线程
+_listeners: Dict[str, QueueListener] = {}
+
+
+def _stop_listeners() -> None:
+    """停止所有后台写入线程（会先写完队列中剩余的日志）"""
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
+
+
+atexit.register(_stop_listeners)
+
+
+class _CachedTimeFormatter(logging.Formatter):
+    """缓存同一秒内 asctime 格式化结果的格式化器（仅在指定 datefmt 时生效）"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cached_time: Tuple[int, str] = (-1, "")
+    
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        if not datefmt:
+            return super().formatTime(record, datefmt)
+        
+        second = int(record.created)
+        cached = self._cached_time
+        if cached[0] != second:
+            cached = (second, super().formatTime(record, datefmt))
+            self._cached_time = cached
+        return cached[1]
 
 
 def setup_logger(
@@ -17,6 +57,9 @@ def setup_logger(
     """
     配置日志记录器
     
+    记录器只挂载 QueueHandler，控制台和文件输出由单独的后台线程完成，
+    业务线程记录日志时不会阻塞在磁盘I/O上
+    
     Args:
         name: 日志记录器名称
         log_file: 日志文件路径
@@ -30,11 +73,16 @@ def setup_logger(
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, level.upper()))
     
-    # 清除已有处理器
+    # 清除已有处理器，并停止之前的后台写入线程
     logger.handlers.clear()
+    previous = _listeners.pop(name, None)
+    if previous is not None:
+        previous.stop()
+        for handler in previous.handlers:
+            handler.close()
     
     # 格式化器
-    formatter = logging.Formatter(
+    formatter = _CachedTimeFormatter(
         fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S"
     )
@@ -42,7 +90,7 @@ def setup_logger(
     # 控制台处理器
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
     
     # 文件处理器
     if log_file:
@@ -56,6 +104,14 @@ def setup_logger(
             encoding="utf-8"
         )
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    # 日志记录入队即返回，由后台线程写入各处理器
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+    logger.addHandler(QueueHandler(log_queue))
+    
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = listener
     
     return logger
@@ -3,17 +3,148 @@
 用于在系统出现异常时及时通知管理员
 """
 
+import atexit
 import logging
+import queue
+import threading
+import time
 import traceback
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional
+from typing import Deque, Iterator, List, Optional, Tuple
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 时间显示格式
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 各类通知的 Markdown 内容模板
+_ERROR_TEMPLATE = (
+    "## ⚠️ 系统异常告警\n"
+    "\n"
+    "**异常时间：** {time}\n"
+    "**异常模块：** {error_type}\n"
+    "\n"
+    "### 错误信息\n"
+    "> {error_message}\n"
+    "\n"
+    "{context}"
+    "---\n"
+    "💡 **建议操作：**\n"
+    "1. 登录服务器查看详细日志\n"
+    "2. 检查各系统连接状态\n"
+    "3. 确认凭证是否过期\n"
+    "\n"
+    "📁 日志文件：`./logs/app.log`"
+)
+
+_SYSTEM_ERROR_TEMPLATE = (
+    "## 🔥 系统异常告警\n"
+    "\n"
+    "**异常时间：** {time}\n"
+    "**异常类型：** `{error_type}`\n"
+    "\n"
+    "### 错误信息\n"
+    "> {error_message}\n"
+    "\n"
+    "### 堆栈摘要\n"
+    "```python\n{traceback}\n```\n"
+    "\n"
+    "{context}"
+    "---\n"
+    "⚠️ **请立即检查系统状态！**\n"
+    "\n"
+    "📁 完整日志：`./logs/app.log`"
+)
+
+_LOGIN_FAILURE_TEMPLATE = (
+    "## ⚠️ 系统登录失败\n"
+    "\n"
+    "**告警时间：** {time}\n"
+    "**目标系统：** {system_name}\n"
+    "**登录账号：** `{username}`\n"
+    "\n"
+    "### 失败原因\n"
+    "> {reason}\n"
+    "\n"
+    "---\n"
+    "💡 **建议操作：**\n"
+    "1. 检查用户名和密码是否正确\n"
+    "2. 确认账号是否被锁定\n"
+    "3. 检查网络连接是否正常\n"
+    "4. 查看目标系统是否维护中"
+)
+
+_PROCESS_FAILURE_TEMPLATE = (
+    "## ❌ {process_name}处理异常\n"
+    "\n"
+    "**异常时间：** {time}\n"
+    "{sn_line}"
+    "\n"
+    "### 错误信息\n"
+    "> {error_message}\n"
+    "\n"
+    "{stats}"
+    "---\n"
+    "💡 **建议操作：**\n"
+    "1. 检查该 SN 是否已在系统中处理\n"
+    "2. 确认库存是否充足\n"
+    "3. 查看目标系统接口状态"
+)
+
+_PROCESS_STATS_TEMPLATE = (
+    "### 处理统计\n"
+    "\n"
+    "- 成功：{success} 条\n"
+    "- 失败：{failed} 条\n"
+    "- 总计：{total} 条\n"
+    "\n"
+)
+
+_DAILY_SUMMARY_TEMPLATE = (
+    "## ✅ 自动化处理完成\n"
+    "\n"
+    "**执行时间：** {time}\n"
+    "**总耗时：** {duration:.1f} 秒\n"
+    "\n"
+    "### 📱 用户机处理结果\n"
+    "- 拣货成功：**{machine_picking}** 条\n"
+    "- 发货成功：**{machine_shipping}** 条\n"
+    "\n"
+    "### 🔌 用户板处理结果\n"
+    "- 拣货成功：**{board_picking}** 条\n"
+    "- 发货成功：**{board_shipping}** 条\n"
+    "\n"
+    "---\n"
+    "🎉 所有流程已正常完成，系统运行正常"
+)
+
+
+def _format_context(context: Optional[dict]) -> str:
+    """
+    格式化上下文信息段落
+    
+    Args:
+        context: 上下文信息
+        
+    Returns:
+        Markdown 段落，没有上下文时为空字符串
+    """
+    if not context:
+        return ""
+    items = "".join(f"- **{key}：** {value}\n" for key, value in context.items())
+    return f"### 上下文信息\n\n{items}\n"
 
 
 class PushNotifier:
     """PushPlus 消息推送器"""
     
     API_URL = "http://www.pushplus.plus/send"
+    # 后台发送队列容量，队列满时改为在调用线程中同步发送
+    QUEUE_SIZE = 64
     
     def __init__(
         self,
@@ -33,6 +164,44 @@ class PushNotifier:
         self.enabled = enabled and bool(token)
         self.title_prefix = title_prefix
         self.logger = logging.getLogger(__name__)
+        
+        # 请求体骨架，发送时复制并填入标题、内容和模板
+        self._payload = {
+            "token": self.token,
+            "title": "",
+            "content": "",
+            "template": "markdown"
+        }
+        
+        # 复用长连接，避免每条通知都重新建立连接
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=4,
+            max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504))
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        
+        # 后台发送队列：业务流程只负责入队，由单独的线程完成网络请求（None 为结束标记）
+        self._queue: "queue.Queue[Optional[Tuple[str, str, str]]]" = queue.Queue(
+            maxsize=self.QUEUE_SIZE
+        )
+        self._worker: Optional[threading.Thread] = None
+        # 入队与停止后台线程互斥，保证结束标记之后不会再有消息入队
+        self._worker_lock = threading.Lock()
+        if self.enabled:
+            self._worker = threading.Thread(
+                target=self._drain,
+                name="push-notifier",
+                daemon=True
+            )
+            self._worker.start()
+            atexit.register(self.shutdown)
+        
+        # 批量模式下暂存的消息 (标题, 内容)，None 表示未处于批量模式
+        self._batch: Optional[List[Tuple[str, str]]] = None
+        self._batch_lock = threading.Lock()
     
     def _send(
         self,
@@ -41,7 +210,7 @@ class PushNotifier:
         template: str = "markdown"
     ) -> bool:
         """
-        发送消息
+        提交消息到后台队列异步发送
         
         Args:
             title: 消息标题
@@ -49,7 +218,7 @@ class PushNotifier:
             template: 消息模板类型
             
         Returns:
-            是否发送成功
+            是否已加入发送队列（队列已满时为同步发送是否成功）
         """
         if not self.enabled:
             self.logger.debug("通知功能未启用，跳过发送")
@@ -59,37 +228,139 @@ class PushNotifier:
             self.logger.warning("未配置 PushPlus token，无法发送通知")
             return False
         
+        with self._batch_lock:
+            if self._batch is not None:
+                self._batch.append((title, content))
+                return True
+        
+        with self._worker_lock:
+            # 后台线程已停止（进程退出阶段）时改为同步发送
+            queued = self._worker is not None
+            if queued:
+                try:
+                    self._queue.put_nowait((title, content, template))
+                except queue.Full:
+                    self.logger.warning("通知发送队列已满，改为同步发送: %s", title)
+                    queued = False
+        
+        return queued or self._deliver(title, content, template)
+    
+    def begin_batch(self) -> None:
+        """开始批量模式，之后的通知暂存，直到 end_batch 时合并发送"""
+        with self._batch_lock:
+            if self._batch is None:
+                self._batch = []
+    
+    def end_batch(self) -> bool:
+        """
+        结束批量模式，将暂存的通知合并为一条消息发送
+        
+        Returns:
+            是否已加入发送队列（没有暂存的通知时返回False）
+        """
+        with self._batch_lock:
+            messages, self._batch = self._batch or [], None
+        
+        if not messages:
+            return False
+        
+        if len(messages) == 1:
+            title, content = messages[0]
+        else:
+            title = f"📬 {self.title_prefix} - 本轮共 {len(messages)} 条通知"
+            content = "\n\n---\n\n".join(content for _, content in messages)
+        
+        return self._send(title, content, template="markdown")
+    
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """批量模式上下文：上下文内的通知在退出时合并为一条消息发送"""
+        self.begin_batch()
+        try:
+            yield
+        finally:
+            self.end_batch()
+    
+    def flush(self) -> None:
+        """等待队列中的消息全部发送完成"""
+        self._queue.join()
+    
+    def shutdown(self, timeout: Optional[float] = 30) -> None:
+        """
+        发送完队列中的消息后停止后台线程
+        
+        Args:
+            timeout: 写入结束标记并等待后台线程结束的总最长秒数，None 表示一直等待
+        """
+        with self._worker_lock:
+            worker, self._worker = self._worker, None
+        if worker is None:
+            return
+        
+        deadline = None if timeout is None else time.monotonic() + timeout
         try:
-            payload = {
-                "token": self.token,
-                "title": title,
-                "content": content,
-                "template": template
-            }
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            self.logger.warning("通知发送队列已满，放弃等待剩余 %d 条通知", self._queue.qsize())
+            return
+        
+        worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if worker.is_alive():
+            self.logger.warning("等待通知发送超时，剩余 %d 条通知未发送", self._queue.qsize())
+    
+    def _drain(self) -> None:
+        """后台线程：依次取出队列中的消息并发送，收到结束标记时退出"""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._deliver(*item)
+            finally:
+                self._queue.task_done()
+    
+    def _deliver(
+        self,
+        title: str,
+        content: str,
+        template: str = "markdown"
+    ) -> bool:
+        """
+        发送消息
+        
+        Args:
+            title: 消息标题
+            content: 消息内容
+            template: 消息模板类型
             
-            response = requests.post(
+        Returns:
+            是否发送成功
+        """
+        try:
+            # 复制骨架而非原地修改：队列满时调用线程与后台线程可能同时发送
+            response = self._session.post(
                 self.API_URL,
-                json=payload,
+                json=dict(self._payload, title=title, content=content, template=template),
                 timeout=10
             )
             response.raise_for_status()
             
-            result = response.json()
+            result = orjson.loads(response.content)
             if result.get("code") == 200:
-                self.logger.debug(f"通知发送成功: {title}")
+                self.logger.debug("通知发送成功: %s", title)
                 return True
             else:
-                self.logger.warning(f"通知发送失败: {result.get('msg', '未知错误')}")
+                self.logger.warning("通知发送失败: %s", result.get('msg', '未知错误'))
                 return False
                 
         except requests.exceptions.Timeout:
             self.logger.error("发送通知超时")
             return False
         except requests.exceptions.RequestException as e:
-            self.logger.error(f"发送通知请求失败: {e}")
+            self.logger.error("发送通知请求失败: %s", e)
             return False
         except Exception as e:
-            self.logger.error(f"发送通知时发生异常: {e}")
+            self.logger.error("发送通知时发生异常: %s", e)
             return False
     
     def send_error(
@@ -107,41 +378,15 @@ class PushNotifier:
             context: 额外的上下文信息
             
         Returns:
-            是否发送成功
+            是否已加入发送队列
         """
         title = f"❌ {self.title_prefix} - {error_type}异常"
-        
-        # 构建 Markdown 格式的消息内容
-        lines = [
-            "## ⚠️ 系统异常告警",
-            "",
-            f"**异常时间：** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            f"**异常模块：** {error_type}",
-            "",
-            "### 错误信息",
-            f"> {error_message}",
-            ""
-        ]
-        
-        # 添加上下文信息
-        if context:
-            lines.extend(["### 上下文信息", ""])
-            for key, value in context.items():
-                lines.append(f"- **{key}：** {value}")
-            lines.append("")
-        
-        # 添加建议
-        lines.extend([
-            "---",
-            "💡 **建议操作：**",
-            "1. 登录服务器查看详细日志",
-            "2. 检查各系统连接状态",
-            "3. 确认凭证是否过期",
-            "",
-            f"📁 日志文件：`./logs/app.log`"
-        ])
-        
-        content = "\n".join(lines)
+        content = _ERROR_TEMPLATE.format(
+            time=datetime.now().strftime(_TIME_FORMAT),
+            error_type=error_type,
+            error_message=error_message,
+            context=_format_context(context)
+        )
         return self._send(title, content, template="markdown")
     
     def send_system_error(self, error: Exception, context: Optional[dict] = None) -> bool:
@@ -153,47 +398,31 @@ class PushNotifier:
             context: 额外的上下文信息
             
         Returns:
-            是否发送成功
+            是否已加入发送队列
         """
         error_type = error.__class__.__name__
         error_message = str(error)
         
         title = f"🚨 {self.title_prefix} - 系统异常"
         
-        # 获取异常堆栈
-        tb = traceback.format_exc()
-        # 只取前 10 行，避免消息过长
-        tb_lines = tb.strip().split("\n")[-10:]
-        tb_summary = "\n".join(tb_lines)
-        
-        lines = [
-            "## 🔥 系统异常告警",
-            "",
-            f"**异常时间：** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            f"**异常类型：** `{error_type}`",
-            "",
-            "### 错误信息",
-            f"> {error_message}",
-            "",
-            "### 堆栈摘要",
-            f"```python\n{tb_summary}\n```",
-            ""
-        ]
-        
-        if context:
-            lines.extend(["### 上下文信息", ""])
-            for key, value in context.items():
-                lines.append(f"- **{key}：** {value}")
-            lines.append("")
-        
-        lines.extend([
-            "---",
-            "⚠️ **请立即检查系统状态！**",
-            "",
-            f"📁 完整日志：`./logs/app.log`"
-        ])
-        
-        content = "\n".join(lines)
+        # 获取异常堆栈（使用异常对象自带的traceback，不依赖当前是否处于except块中）
+        # 逐段格式化，只保留最后 10 行，避免消息过长，也不必拼出完整的堆栈字符串
+        tb_lines: Deque[str] = deque(maxlen=10)
+        pending = ""
+        for chunk in traceback.TracebackException.from_exception(error).format():
+            *lines, pending = (pending + chunk).split("\n")
+            tb_lines.extend(lines)
+        if pending:
+            tb_lines.append(pending)
+        tb_summary = "\n".join(tb_lines).rstrip()
+        
+        content = _SYSTEM_ERROR_TEMPLATE.format(
+            time=datetime.now().strftime(_TIME_FORMAT),
+            error_type=error_type,
+            error_message=error_message,
+            traceback=tb_summary,
+            context=_format_context(context)
+        )
         return self._send(title, content, template="markdown")
     
     def send_login_failure(
@@ -211,29 +440,16 @@ class PushNotifier:
             reason: 失败原因
             
         Returns:
-            是否发送成功
+            是否已加入发送队列
         """
         title = f"🔐 {self.title_prefix} - 登录失败"
         
-        lines = [
-            "## ⚠️ 系统登录失败",
-            "",
-            f"**告警时间：** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            f"**目标系统：** {system_name}",
-            f"**登录账号：** `{username}`",
-            "",
-            "### 失败原因",
-            f"> {reason}",
-            "",
-            "---",
-            "💡 **建议操作：**",
-            "1. 检查用户名和密码是否正确",
-            "2. 确认账号是否被锁定",
-            "3. 检查网络连接是否正常",
-            "4. 查看目标系统是否维护中"
-        ]
-        
-        content = "\n".join(lines)
+        content = _LOGIN_FAILURE_TEMPLATE.format(
+            time=datetime.now().strftime(_TIME_FORMAT),
+            system_name=system_name,
+            username=username,
+            reason=reason
+        )
         return self._send(title, content, template="markdown")
     
     def send_process_failure(
@@ -253,42 +469,21 @@ class PushNotifier:
             stats: 处理统计信息
             
         Returns:
-            是否发送成功
+            是否已加入发送队列
         """
         title = f"📦 {self.title_prefix} - {process_name}失败"
         
-        lines = [
-            f"## ❌ {process_name}处理异常",
-            "",
-            f"**异常时间：** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-        ]
-        
-        if sn_code:
-            lines.append(f"**SN 编码：** `{sn_code}`")
-        
-        lines.extend([
-            "",
-            "### 错误信息",
-            f"> {error_message}",
-            ""
-        ])
-        
-        if stats:
-            lines.extend(["### 处理统计", ""])
-            lines.append(f"- 成功：{stats.get('success', 0)} 条")
-            lines.append(f"- 失败：{stats.get('failed', 0)} 条")
-            lines.append(f"- 总计：{stats.get('total', 0)} 条")
-            lines.append("")
-        
-        lines.extend([
-            "---",
-            "💡 **建议操作：**",
-            "1. 检查该 SN 是否已在系统中处理",
-            "2. 确认库存是否充足",
-            "3. 查看目标系统接口状态"
-        ])
-        
-        content = "\n".join(lines)
+        content = _PROCESS_FAILURE_TEMPLATE.format(
+            process_name=process_name,
+            time=datetime.now().strftime(_TIME_FORMAT),
+            sn_line=f"**SN 编码：** `{sn_code}`\n" if sn_code else "",
+            error_message=error_message,
+            stats=_PROCESS_STATS_TEMPLATE.format(
+                success=stats.get("success", 0),
+                failed=stats.get("failed", 0),
+                total=stats.get("total", 0)
+            ) if stats else ""
+        )
         return self._send(title, content, template="markdown")
     
     def send_daily_summary(
@@ -306,29 +501,18 @@ class PushNotifier:
             duration: 执行耗时（秒）
             
         Returns:
-            是否发送成功
+            是否已加入发送队列
         """
         title = f"📊 {self.title_prefix} - 处理完成汇总"
         
-        lines = [
-            "## ✅ 自动化处理完成",
-            "",
-            f"**执行时间：** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            f"**总耗时：** {duration:.1f} 秒",
-            "",
-            "### 📱 用户机处理结果",
-            f"- 拣货成功：**{user_machine_stats.get('picking_success', 0)}** 条",
-            f"- 发货成功：**{user_machine_stats.get('shipping_success', 0)}** 条",
-            "",
-            "### 🔌 用户板处理结果",
-            f"- 拣货成功：**{user_board_stats.get('picking_success', 0)}** 条",
-            f"- 发货成功：**{user_board_stats.get('shipping_success', 0)}** 条",
-            "",
-            "---",
-            "🎉 所有流程已正常完成，系统运行正常"
-        ]
-        
-        content = "\n".join(lines)
+        content = _DAILY_SUMMARY_TEMPLATE.format(
+            time=datetime.now().strftime(_TIME_FORMAT),
+            duration=duration,
+            machine_picking=user_machine_stats.get("picking_success", 0),
+            machine_shipping=user_machine_stats.get("shipping_success", 0),
+            board_picking=user_board_stats.get("picking_success", 0),
+            board_shipping=user_board_stats.get("shipping_success", 0)
+        )
         return self._send(title, content, template="markdown")
 
 